@@ -0,0 +1,406 @@
+# Load generator for Bloop's command callbacks — no Discord connection needed.
+#   python benchmarks/loadtest.py [--ops 5000] [--concurrency 200] [--users 500] [--min-rate 0]
+#
+# Builds fake Context / Interaction / channel objects, stubs the REST layer (every send/edit/ack
+# goes through FakeHTTP, with optional simulated latency) and fires concurrent bloopplay,
+# bloopgift, borrow (+ accept), repay, bloopbank and bloopboard invocations at the real callbacks in main.py.
+#
+# Two phases:
+#   transfers  gifts + loans + repayments + reads; total money in the guild must be conserved
+#   games      random / coin / wheel / dice / blackjack / matchmaking queue + reads; balances must
+#              never go negative
+# In both, the incrementally maintained economy stats must still match the users table.
+#
+# Reports commands/s, latency percentiles per command, time spent waiting on storage and the
+# invariant checks. Exits non-zero if an invariant fails or throughput is below --min-rate, so it
+# can gate CI.
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+
+START_BALANCE = 1_000
+
+# -------------------------
+# STUBBED HTTP / DISCORD OBJECTS
+# -------------------------
+class FakeHTTP:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.calls = 0
+
+    async def request(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        else:
+            await asyncio.sleep(0)
+
+class FakeMessage:
+    ids = itertools.count(1)
+
+    def __init__(self, http, channel, content=None, embed=None, view=None):
+        self.http = http
+        self.id = next(FakeMessage.ids)
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.view = view
+
+    async def edit(self, content=None, embed=None, view=None, **kwargs):
+        await self.http.request()
+        self.content, self.embed, self.view = content, embed, view
+
+    async def add_reaction(self, emoji):
+        await self.http.request()
+
+class FakeChannelPermissions:
+    view_channel = True
+    send_messages = True
+
+class FakeChannel:
+    def __init__(self, http, channel_id: int):
+        self.http = http
+        self.id = channel_id
+        self.mention = f"<#{channel_id}>"
+
+    def permissions_for(self, member):
+        return FakeChannelPermissions()
+
+    async def send(self, content=None, *, embed=None, view=None, **kwargs):
+        await self.http.request()
+        return FakeMessage(self.http, self, content, embed, view)
+
+class FakePermissions:
+    administrator = False
+    manage_guild = False
+    manage_roles = False
+
+class FakeMember:
+    def __init__(self, guild, user_id: int):
+        self.guild = guild
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+        self.guild_permissions = FakePermissions()
+
+    def __str__(self):
+        return self.name
+
+class FakeGuild:
+    def __init__(self, guild_id: int, n_users: int):
+        self.id = guild_id
+        self.name = f"loadtest-{guild_id}"
+        self.members = {uid: FakeMember(self, uid) for uid in range(1, n_users + 1)}
+
+    def get_member(self, user_id: int):
+        return self.members.get(user_id)
+
+class FakeMessageRef:
+    def __init__(self, mentions):
+        self.mentions = mentions
+
+class FakeContext:
+    def __init__(self, guild, author, channel, mentions=()):
+        self.guild = guild
+        self.author = author
+        self.channel = channel
+        self.message = FakeMessageRef(list(mentions))
+        self.last_message = None  # per-invocation, since channels are shared between concurrent ops
+
+    async def send(self, content=None, **kwargs):
+        self.last_message = await self.channel.send(content, **kwargs)
+        return self.last_message
+
+class FakeResponse:
+    def __init__(self, http):
+        self.http = http
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, content=None, **kwargs):
+        await self.http.request()
+        self.done = True
+
+    async def edit_message(self, **kwargs):
+        await self.http.request()
+        self.done = True
+
+class FakeInteraction:
+    def __init__(self, http, user, channel_id: int):
+        self.user = user
+        self.channel_id = channel_id
+        self.response = FakeResponse(http)
+        self.data = {}
+
+# -------------------------
+# INSTRUMENTATION
+# -------------------------
+class StoreTimer:
+    # time spent awaiting storage calls (for SQLite that's the loop blocked in sqlite3; for
+    # Postgres it includes pool waits and row-lock waits) and how often the backend reported
+    # busy/locked/deadlock errors
+    def __init__(self):
+        self.samples = []
+        self.busy_errors = 0
+
+    def wrap(self, fn):
+        async def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                text = f"{type(e).__name__} {e}".lower()
+                if any(w in text for w in ("locked", "busy", "deadlock", "locknotavailable")):
+                    self.busy_errors += 1
+                raise
+            finally:
+                self.samples.append(time.perf_counter() - t0)
+        return timed
+
+    def instrument(self, store):
+        for name in STORE_METHODS:
+            setattr(store, name, self.wrap(getattr(store, name)))
+
+STORE_METHODS = ("get_currency", "get_balance", "add_balance", "try_debit", "transfer", "top_balances",
+                 "get_cooldown", "set_cooldown", "claim_cooldown", "create_loan", "accept_loan", "reject_loan", "repay_loan",
+                 "open_session", "join_session", "close_session")
+
+def percentile(sorted_samples, p):
+    if not sorted_samples:
+        return 0.0
+    k = min(len(sorted_samples) - 1, int(round(p / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[k]
+
+# -------------------------
+# WORKLOAD
+# -------------------------
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.http = FakeHTTP(args.http_latency_ms)
+        self.guild = FakeGuild(args.guild_id, args.users)
+        self.channels = [FakeChannel(self.http, 10_000 + i) for i in range(args.channels)]
+        self.latencies = {}  # op name -> [seconds]
+        self.errors = {}  # op name -> count
+        self.db_timer = StoreTimer()
+
+        cmds = {name: main.bot.get_command(name).callback
+                for name in ("bloopplay", "bloopgift", "borrow", "repay", "bloopqueue", "bloopbank", "bloopboard")}
+        self.cmd = cmds
+
+    async def setup_db(self, path):
+        store = await main.open_storage(path)
+        for uid in self.guild.members:
+            await store.add_balance(self.guild.id, uid, START_BALANCE)
+        self.db_timer.instrument(store)
+        await main.guild_stats(self.guild.id)  # seed now so every write below goes through the aggregates
+        # no join window / per-user throttles under load; they'd only measure asyncio.sleep. Set
+        # as this guild's config (below !bloopconfig's limits, which only the command enforces)
+        await main.guild_configs.update(self.guild.id, {"join_window_seconds": 0.01, "gamble_cooldown_seconds": 0})
+
+    async def total_money(self) -> int:
+        return (await main.store.balance_summary(self.guild.id))[0]
+
+    async def min_balance(self) -> int:
+        return (await main.store.balance_summary(self.guild.id))[2]
+
+    async def stats_match_db(self) -> bool:
+        total, holders, _ = await main.store.balance_summary(self.guild.id)
+        g = main.economy_stats.guild(self.guild.id)
+        return (g.supply, g.holders) == (total, holders)
+
+    def member(self):
+        return self.guild.members[self.rng.randint(1, len(self.guild.members))]
+
+    def ctx(self, author=None, mentions=()):
+        return FakeContext(self.guild, author or self.member(), self.rng.choice(self.channels), mentions)
+
+    # --- ops ---
+    async def op_bank(self):
+        await self.cmd["bloopbank"](self.ctx())
+
+    async def op_board(self):
+        await self.cmd["bloopboard"](self.ctx())
+
+    async def op_gift(self):
+        sender, receiver = self.member(), self.member()
+        if sender.id == receiver.id:
+            return
+        await self.cmd["bloopgift"](self.ctx(sender), receiver, self.rng.randint(1, 50))
+
+    async def op_loan(self):
+        borrower, lender = self.member(), self.member()
+        if borrower.id == lender.id:
+            return
+        ctx = self.ctx(borrower)
+        await self.cmd["borrow"](ctx, lender, self.rng.randint(1, 100))
+        view = ctx.last_message.view if ctx.last_message else None
+        if view is None:
+            return
+        button = view.children[0] if self.rng.random() < 0.8 else view.children[1]  # accept / reject
+        await button.callback(FakeInteraction(self.http, lender, ctx.channel.id))
+
+    async def op_repay(self):
+        await self.cmd["repay"](self.ctx())
+
+    async def op_random(self):
+        await self.cmd["bloopplay"](self.ctx(), "random")
+
+    async def op_coin(self):
+        await self.cmd["bloopplay"](self.ctx(), "coin", str(self.rng.randint(1, 20)), self.rng.choice(["heads", "tails"]))
+
+    async def op_wheel(self):
+        await self.cmd["bloopplay"](self.ctx(), "wheel", str(self.rng.randint(1, 20)))
+
+    async def op_blackjack(self):
+        ctx = self.ctx()
+        await self.cmd["bloopplay"](ctx, "blackjack", str(self.rng.randint(1, 20)))
+        view = ctx.last_message.view if ctx.last_message else None
+        if view is not None and not view.finished:
+            await view.stand.callback(FakeInteraction(self.http, ctx.author, ctx.channel.id))
+
+    async def op_dice(self):
+        ctx = self.ctx()
+        game = asyncio.create_task(self.cmd["bloopplay"](ctx, "dice", str(self.rng.randint(1, 20))))
+        while ctx.last_message is None and not game.done():
+            await asyncio.sleep(0)
+        msg = ctx.last_message
+        if msg is not None and msg.view is not None:
+            join = msg.view.children[0].callback
+            for _ in range(self.rng.randint(0, 3)):
+                if ctx.channel.id not in main.dice_sessions:
+                    break
+                await join(FakeInteraction(self.http, self.member(), ctx.channel.id))
+        await game
+
+    async def op_queue(self):
+        if self.rng.random() < 0.5:
+            await self.cmd["bloopqueue"](self.ctx(), "ttt")
+        else:
+            await self.cmd["bloopqueue"](self.ctx(), "dice", str(self.rng.randint(1, 20)))
+
+    PHASES = {
+        "transfers": {"op_gift": 5, "op_loan": 2, "op_repay": 1, "op_bank": 2, "op_board": 1},
+        "games": {"op_random": 2, "op_coin": 3, "op_wheel": 3, "op_blackjack": 2, "op_dice": 1, "op_queue": 1,
+                  "op_bank": 2, "op_board": 1},
+    }
+
+    async def run_op(self, name, sem):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await getattr(self, name)()
+            except Exception as e:  # keep going; a crash in a callback is a finding, not the end of the run
+                self.errors[name] = self.errors.get(name, 0) + 1
+                if self.errors[name] == 1:
+                    print(f"  {name} raised {type(e).__name__}: {e}")
+            self.latencies.setdefault(name, []).append(time.perf_counter() - t0)
+
+    async def run_phase(self, phase):
+        mix = self.PHASES[phase]
+        names = self.rng.choices(list(mix), weights=list(mix.values()), k=self.args.ops)
+        sem = asyncio.Semaphore(self.args.concurrency)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(self.run_op(n, sem) for n in names))
+        return time.perf_counter() - t0
+
+def print_latencies(latencies):
+    print(f"  {'command':<14}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, samples in sorted(latencies.items()):
+        s = sorted(samples)
+        print(f"  {name[3:]:<14}{len(s):>7}" + "".join(f"{percentile(s, p) * 1000:>10.2f}" for p in (50, 95, 99))
+              + f"{s[-1] * 1000:>10.2f}")
+
+async def run(args):
+    lt = LoadTest(args)
+    tmp = tempfile.mkdtemp(prefix="bloop-load-")
+    if args.database_url:
+        os.environ["BLOOP_DATABASE_URL"] = args.database_url
+        await lt.setup_db(None)
+    else:
+        await lt.setup_db(args.db or os.path.join(tmp, "load.sqlite3"))
+
+    results = {"phases": {}, "ok": True}
+    for phase in ("transfers", "games"):
+        lt.latencies.clear()
+        lt.db_timer.samples.clear()
+        before = await lt.total_money()
+        elapsed = await lt.run_phase(phase)
+        after = await lt.total_money()
+        rate = args.ops / elapsed
+        db = sorted(lt.db_timer.samples)
+        checks = {"no_negative_balances": await lt.min_balance() >= 0, "stats_match_db": await lt.stats_match_db()}
+        if phase == "transfers":
+            checks["money_conserved"] = before == after
+        ok = all(checks.values()) and rate >= args.min_rate and not lt.errors
+        results["ok"] &= ok
+
+        print(f"\n== {phase}: {args.ops} commands in {elapsed:.2f}s → {rate:,.0f} commands/s")
+        print_latencies(lt.latencies)
+        print(f"  storage: {len(db)} calls, {sum(db) * 1000:.1f} ms awaited, "
+              f"p99 {percentile(db, 99) * 1000:.3f} ms, max {(db[-1] if db else 0) * 1000:.3f} ms, "
+              f"busy/locked errors {lt.db_timer.busy_errors}")
+        print(f"  money: {before:,} → {after:,}   " + "  ".join(f"{k}={'PASS' if v else 'FAIL'}" for k, v in checks.items()))
+        if lt.errors:
+            print(f"  callback errors: {lt.errors}")
+        results["phases"][phase] = {
+            "commands_per_s": rate,
+            "latency_ms": {n[3:]: {f"p{p}": percentile(sorted(s), p) * 1000 for p in (50, 95, 99)}
+                           for n, s in lt.latencies.items()},
+            "db_wait_ms": sum(db) * 1000,
+            "db_busy_errors": lt.db_timer.busy_errors,
+            "money_before": before, "money_after": after,
+            "checks": checks, "errors": dict(lt.errors),
+        }
+        lt.errors.clear()
+
+    while main.outbound.workers:  # let queued game results finish sending
+        await asyncio.sleep(0.01)
+    ob = main.outbound
+    print(f"\nstubbed REST calls: {lt.http.calls:,}")
+    mm = main.matchmaker
+    print(f"matchmaking: {sum(mm.matches.values()):,} matches, {len(mm.by_user)} still waiting, "
+          f"dice lobbies {main.dice_lobby_results}")
+    print(f"outbound: {ob.sent:,} sent, {ob.merged:,} merged, {ob.dropped:,} cosmetic dropped, {ob.rate_limited} 429s")
+    results["outbound"] = {"sent": ob.sent, "merged": ob.merged, "dropped": ob.dropped, "rate_limited": ob.rate_limited}
+    await main.store.close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results["ok"]
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Bloop command load test (fake Discord client)")
+    parser.add_argument("--ops", type=int, default=5000, help="commands per phase")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--guild-id", type=int, default=1)
+    parser.add_argument("--http-latency-ms", type=float, default=0.0, help="simulated REST round trip")
+    parser.add_argument("--min-rate", type=float, default=0.0, help="fail if commands/s drops below this")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--db", help="sqlite path (default: fresh temp file)")
+    parser.add_argument("--database-url", help="postgresql://... to load-test the Postgres backend instead")
+    parser.add_argument("--json", help="also write results as JSON here")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,110 @@
+# Memory benchmark: member cache policies against a synthetic large guild.
+#   python benchmarks/member_cache.py [--members 100000]
+#
+# Feeds the same GUILD_CREATE-style payload (N members) through discord.py's own Guild/Member
+# construction under each BLOOP_MEMBER_CACHE policy and reports the memory still held once the
+# payload is gone (tracemalloc), plus build time. The "none" policy is then paired with the
+# MemberNameCache holding the names the leaderboard actually needs (top 10, or the LRU's cap).
+# Also prints the size of the member list that chunk_guilds_at_startup=True would download.
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import discord  # noqa: E402
+from discord.state import ConnectionState  # noqa: E402
+
+import main  # noqa: E402
+
+GUILD_ID = 900_000_000_000_000_000
+
+def member_payload(i: int) -> dict:
+    uid = str(100_000_000_000_000_000 + i)
+    return {
+        "user": {"id": uid, "username": f"user{i}", "discriminator": "0", "global_name": f"User {i}", "avatar": None},
+        "nick": f"nick{i}" if i % 3 == 0 else None,
+        "roles": [],
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+        "pending": False,
+        "premium_since": None,
+        "communication_disabled_until": None,
+    }
+
+def guild_payload(n: int) -> dict:
+    return {
+        "id": str(GUILD_ID),
+        "name": "synthetic",
+        "owner_id": "1",
+        "roles": [],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "channels": [],
+        "large": True,
+        "member_count": n,
+        "members": [member_payload(i) for i in range(n)],
+    }
+
+def make_state(policy: str) -> ConnectionState:
+    return ConnectionState(dispatch=lambda *a, **k: None, handlers={}, hooks={}, http=None,
+                           intents=main.intents, member_cache_flags=main.member_cache_flags(policy),
+                           max_messages=main.MAX_MESSAGES, chunk_guilds_at_startup=False)
+
+def measure(policy: str, n: int):
+    gc.collect()
+    tracemalloc.start()
+    state = make_state(policy)
+    base = tracemalloc.get_traced_memory()[0]
+    payload = guild_payload(n)
+    t0 = time.perf_counter()
+    guild = discord.Guild(data=payload, state=state)
+    elapsed = time.perf_counter() - t0
+    del payload
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return guild, retained, elapsed
+
+def measure_name_cache(n_names: int):
+    gc.collect()
+    tracemalloc.start()
+    cache = main.MemberNameCache(maxsize=n_names)
+    base = tracemalloc.get_traced_memory()[0]
+    for i in range(n_names):
+        cache.put(GUILD_ID, 100_000_000_000_000_000 + i, f"nick{i}")
+    retained = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return retained
+
+def mib(b: int) -> str:
+    return f"{b / 2**20:8.1f} MiB"
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Bloop member cache memory benchmark")
+    parser.add_argument("--members", type=int, default=100_000)
+    args = parser.parse_args()
+    n = args.members
+
+    chunk_bytes = len(json.dumps([member_payload(i) for i in range(n)]))
+    print(f"synthetic guild: {n:,} members, member list ≈ {mib(chunk_bytes)} of JSON to chunk at startup")
+    print(f"{'policy':<28}{'cached':>10}{'retained':>16}{'build':>12}")
+    for policy in ("all", "joined", "none"):
+        guild, retained, elapsed = measure(policy, n)
+        print(f"{policy:<28}{len(guild.members):>10,}{mib(retained):>16}{elapsed * 1000:>10.0f}ms")
+        del guild
+    for names in (10, main.MEMBER_NAME_CACHE_SIZE):
+        label = f"none + {names:,} LRU names"
+        print(f"{label:<28}{names:>10,}{mib(measure_name_cache(names)):>16}{'':>12}")
+
+if __name__ == "__main__":
+    main_cli()
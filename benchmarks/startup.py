@@ -0,0 +1,108 @@
+# Startup / reconnect benchmark for Bloop.
+#   python benchmarks/startup.py [--runs 5]
+#
+# Measures, without connecting to Discord:
+#   - cold `import main` in a fresh interpreter
+#   - open_storage() on a fresh file (all migrations) and on an already-migrated file (restart path)
+#   - the per-process command sync step when the tree hash is new vs unchanged
+#   - the on_ready handler, which is all that runs on a gateway reconnect
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+def report(label, samples):
+    print(f"{label:<38} median {statistics.median(samples):8.2f} ms   min {min(samples):8.2f} ms")
+
+def bench_import(runs):
+    def run():
+        subprocess.run([sys.executable, "-c", "import main"], cwd=ROOT, check=True)
+    baseline = timed(lambda: subprocess.run([sys.executable, "-c", "pass"], check=True), runs)
+    samples = timed(run, runs)
+    report("interpreter startup (baseline)", baseline)
+    report("cold `import main`", samples)
+
+async def atimed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+async def bench_db(main, runs):
+    tmp = tempfile.mkdtemp(prefix="bloop-bench-")
+
+    async def fresh():
+        path = os.path.join(tmp, f"fresh-{time.perf_counter_ns()}.sqlite3")
+        await (await main.open_storage(path)).close()
+
+    existing = os.path.join(tmp, "existing.sqlite3")
+    await (await main.open_storage(existing)).close()
+
+    async def restart():
+        await (await main.open_storage(existing)).close()
+
+    report("open_storage() fresh file (migrate)", await atimed(fresh, runs))
+    report("open_storage() migrated (restart)", await atimed(restart, runs))
+    await main.open_storage(existing)
+
+async def bench_sync(main, runs):
+    calls = []
+
+    async def fake_sync(*args, **kwargs):
+        calls.append(time.perf_counter())
+        return main.tree.get_commands()
+
+    main.tree.sync = fake_sync
+    main.store.conn.execute("DELETE FROM bot_meta")
+    main.store.conn.commit()
+    t0 = time.perf_counter()
+    await main.sync_commands_if_changed()
+    changed = (time.perf_counter() - t0) * 1000
+    unchanged = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        await main.sync_commands_if_changed()
+        unchanged.append((time.perf_counter() - t0) * 1000)
+    print(f"{'command sync, tree changed':<38} {changed:8.2f} ms   (REST calls: 1, stubbed)")
+    report("command sync, tree unchanged", unchanged)
+    print(f"{'tree.sync() REST calls over all runs':<38} {len(calls)}")
+
+    reconnect = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        await main.on_ready()
+        reconnect.append((time.perf_counter() - t0) * 1000)
+    report("on_ready() (every reconnect)", reconnect)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Bloop startup / reconnect benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    bench_import(args.runs)
+    import main
+    async def run():
+        await bench_db(main, args.runs)
+        await bench_sync(main, args.runs)
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main_cli()
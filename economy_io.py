@@ -0,0 +1,350 @@
+# Bloop — per-guild economy export / import and hot database snapshots.
+#
+#   python economy_io.py export   --db bloop.sqlite3 --guild 123 -o guild-123.ndjson.gz
+#   python economy_io.py import   --db bloop.sqlite3 -i guild-123.ndjson.gz [--guild 456] [--replace]
+#   python economy_io.py snapshot --db bloop.sqlite3 -o backup.sqlite3
+#
+# Export format (newline-delimited JSON, gzip if the file name ends in .gz):
+#   {"bloop_export": 1, "guild_id": ..., "exported_at": ...}     header
+#   {"table": "users", "columns": ["user_id", "balance", ...]}  one per table
+#   [123, 500, ...]                                              rows as arrays, in column order
+# guild_id is not repeated per row, so a guild can be imported under a different id.
+#
+# Only the standard library is used so the CLI works without discord.py installed.
+
+import argparse
+import gzip
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 5000
+MAX_UPLOAD_BYTES = 256 * 1024 * 1024  # decompressed size cap for uploaded attachments
+
+# table -> exported columns (guild_id is implicit)
+TABLES = {
+    "servers": ("currency_name", "debt", "treasury"),
+    "users": ("user_id", "balance", "last_daily", "badge_bits"),
+    "cooldowns": ("user_id", "name", "next_time"),
+    "loans": ("lender_id", "borrower_id", "amount", "status", "created_at"),
+    "guild_config": ("version", "settings", "updated_at"),
+    "economy_flows": ("source", "credited", "debited"),
+}
+
+# upserts keep imports idempotent; loans get fresh ids in the target database and are matched on
+# their natural key (unique index loans_natural_key), so only their status is updated on a re-run
+UPSERTS = {
+    "servers": ("guild_id",),
+    "users": ("guild_id", "user_id"),
+    "cooldowns": ("guild_id", "user_id", "name"),
+    "loans": ("guild_id", "lender_id", "borrower_id", "amount", "created_at"),
+    "guild_config": ("guild_id",),
+    "economy_flows": ("guild_id", "source"),
+}
+
+# Imports come from guild admins, so every column is checked before it is written; a failing
+# row aborts the import (ValueError naming the line) and rolls back whatever isn't committed.
+MAX_INT = 2**63 - 1
+LOAN_STATUSES = ("pending", "accepted", "rejected", "repaid")
+
+def check_int(lo: int = 0, hi: int = MAX_INT):
+    def check(v):
+        if not isinstance(v, int) or isinstance(v, bool) or not lo <= v <= hi:
+            raise ValueError(f"expected an integer in [{lo}, {hi}], got {v!r}")
+        return v
+    return check
+
+def check_text(max_len: int, optional: bool = True, allowed: tuple = None):
+    def check(v):
+        if v is None and optional:
+            return v
+        if not isinstance(v, str) or len(v) > max_len or (allowed and v not in allowed):
+            raise ValueError(f"expected {'one of ' + ', '.join(allowed) if allowed else f'text up to {max_len} chars'}, "
+                             f"got {v!r}")
+        return v
+    return check
+
+def check_time(optional: bool = True):
+    def check(v):
+        if v is None and optional:
+            return v
+        if not isinstance(v, str):
+            raise ValueError(f"expected an ISO timestamp, got {v!r}")
+        datetime.fromisoformat(v)
+        return v
+    return check
+
+def check_json_object(v):
+    if not isinstance(v, str) or not isinstance(json.loads(v), dict):
+        raise ValueError(f"expected a JSON object, got {v!r}")
+    return v
+
+COLUMN_CHECKS = {
+    "servers": {"currency_name": check_text(24), "debt": check_int(), "treasury": check_int()},
+    "users": {"user_id": check_int(1), "balance": check_int(), "last_daily": check_time(),
+              "badge_bits": check_int()},
+    "cooldowns": {"user_id": check_int(1), "name": check_text(32, optional=False), "next_time": check_time()},
+    "loans": {"lender_id": check_int(1), "borrower_id": check_int(1), "amount": check_int(1),
+              "status": check_text(16, optional=False, allowed=LOAN_STATUSES),
+              "created_at": check_time(optional=False)},  # part of the natural key; NULLs wouldn't match
+    "guild_config": {"version": check_int(), "settings": check_json_object, "updated_at": check_time()},
+    "economy_flows": {"source": check_text(32, optional=False), "credited": check_int(), "debited": check_int()},
+}
+
+# columns only the host operator may import (the CLI): an admin-supplied treasury could be moved
+# to other guilds with !trade
+TRUSTED_COLUMNS = {"servers": ("debt", "treasury")}
+
+def open_stream(path: str, mode: str):
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def text_stream(data: bytes, max_bytes: int = MAX_UPLOAD_BYTES):
+    # for uploaded attachments: sniff gzip instead of trusting the file name, and decompress
+    # incrementally so a gzip bomb stops at max_bytes instead of exhausting memory
+    if data[:2] == b"\x1f\x8b":
+        try:
+            with gzip.GzipFile(fileobj=io.BytesIO(data)) as gz:
+                data = gz.read(max_bytes + 1)
+        except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+            raise ValueError(f"corrupt gzip file: {e}") from None
+    if len(data) > max_bytes:
+        raise ValueError(f"export is over {max_bytes:,} bytes uncompressed")
+    return io.StringIO(data.decode("utf-8"))
+
+def export_guild(conn: sqlite3.Connection, guild_id: int, fp, chunk_size: int = CHUNK_SIZE) -> dict:
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    fp.write(dumps({"bloop_export": FORMAT_VERSION, "guild_id": guild_id,
+                    "exported_at": datetime.utcnow().isoformat()}) + "\n")
+    counts = {}
+    # one read transaction so the export is a consistent point-in-time view
+    conn.execute("BEGIN")
+    try:
+        for table, cols in TABLES.items():
+            fp.write(dumps({"table": table, "columns": list(cols)}) + "\n")
+            c = conn.execute(f"SELECT {', '.join(cols)} FROM {table} WHERE guild_id=?", (guild_id,))
+            n = 0
+            while True:
+                rows = c.fetchmany(chunk_size)
+                if not rows:
+                    break
+                fp.write("".join(dumps(row) + "\n" for row in rows))
+                n += len(rows)
+            counts[table] = n
+    finally:
+        conn.rollback()
+    return counts
+
+def import_guild(conn: sqlite3.Connection, fp, guild_id: int = None, replace: bool = False,
+                 chunk_size: int = CHUNK_SIZE, commit_every_chunk: bool = False,
+                 trusted: bool = False, check_settings=None) -> dict:
+    # trusted: also import TRUSTED_COLUMNS (and let replace reset them). check_settings(text)
+    # raises ValueError for guild_config settings the bot couldn't load.
+    # commit_every_chunk keeps write locks short when the bot is live on the same file; the
+    # upserts make a re-run after a partial import safe. It is ignored for replace imports: those
+    # are parsed and checked into TEMP staging tables (which take no lock on the database file)
+    # and then swapped in by one short set-based transaction, so a bad line leaves the guild
+    # untouched and the bot's writers only wait for the swap.
+    per_chunk = commit_every_chunk and not replace
+    header = json.loads(fp.readline() or "{}")
+    if not isinstance(header, dict):
+        raise ValueError("not a Bloop export (the first line isn't a JSON object)")
+    if header.get("bloop_export") != FORMAT_VERSION:
+        raise ValueError(f"not a Bloop export (format {header.get('bloop_export')!r}, expected {FORMAT_VERSION})")
+    target = int(guild_id if guild_id is not None else header["guild_id"])
+
+    counts = {}
+    table = sql = None
+    checks = []
+    batch = []
+    staged = {}  # replace imports: table -> columns loaded into temp.stage_<table>
+    row = conn.execute("SELECT version FROM guild_config WHERE guild_id=?", (target,)).fetchone()
+    config_version = row[0] if row else 0
+
+    def flush():
+        if batch:
+            conn.executemany(sql, batch)
+            counts[table] = counts.get(table, 0) + len(batch)
+            batch.clear()
+            if per_chunk:
+                conn.commit()
+
+    conn.execute("BEGIN")
+    try:
+        for lineno, line in enumerate(fp, start=2):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, dict):
+                flush()
+                table = item.get("table")
+                if table not in TABLES:
+                    raise ValueError(f"line {lineno}: unknown table {table!r} in export")
+                allowed = [c for c in TABLES[table] if trusted or c not in TRUSTED_COLUMNS.get(table, ())]
+                columns = item.get("columns")
+                if not isinstance(columns, list):
+                    raise ValueError(f"line {lineno}: table header without columns")
+                width = len(columns)
+                keep = [i for i, c in enumerate(columns) if c in allowed]
+                cols = [columns[i] for i in keep]
+                checks = [COLUMN_CHECKS[table][c] for c in cols]
+                if table == "guild_config" and "settings" in cols and check_settings:
+                    checks[cols.index("settings")] = lambda v: (check_json_object(v), check_settings(v))[0]
+                if replace:
+                    if staged.setdefault(table, cols) != cols:
+                        raise ValueError(f"line {lineno}: {table} appears again with different columns")
+                    conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS stage_{table} AS "
+                                 f"SELECT guild_id, {', '.join(TABLES[table])} FROM main.{table} WHERE 0")
+                    sql = (f"INSERT INTO temp.stage_{table}(guild_id, {', '.join(cols)}) "
+                           f"VALUES({','.join('?' * (len(cols) + 1))})")
+                else:
+                    sql = upsert_sql(table, ["guild_id"] + cols)
+                counts.setdefault(table, 0)
+                continue
+            if table is None:
+                raise ValueError(f"line {lineno}: row before table header")
+            if not isinstance(item, list) or len(item) != width:
+                raise ValueError(f"line {lineno}: expected a row of {width} values")
+            try:
+                batch.append((target, *(check(item[i]) for i, check in zip(keep, checks))))
+            except ValueError as e:
+                raise ValueError(f"line {lineno}: {table}: {e}") from None
+            if len(batch) >= chunk_size:
+                flush()
+        flush()
+        conn.commit()
+        if replace:
+            swap_staged(conn, target, staged, trusted)
+        if counts.get("guild_config") or (replace and config_version):
+            bump_guild_config(conn, target, config_version)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        for t in staged:
+            conn.execute(f"DROP TABLE IF EXISTS temp.stage_{t}")
+    return counts
+
+def swap_staged(conn: sqlite3.Connection, guild_id: int, staged: dict, trusted: bool):
+    # the only part of a replace import that holds the database write lock: delete the guild's
+    # rows and copy the already-validated staging tables in, all in one transaction
+    conn.execute("BEGIN IMMEDIATE")
+    for t in TABLES:
+        if t in TRUSTED_COLUMNS and not trusted:
+            continue  # upserted below without touching the trusted columns
+        conn.execute(f"DELETE FROM {t} WHERE guild_id=?", (guild_id,))
+    for t, cols in staged.items():
+        cols = ["guild_id"] + cols
+        # "WHERE true" keeps SQLite from reading ON CONFLICT as a join constraint
+        conn.execute(f"INSERT INTO main.{t}({', '.join(cols)}) SELECT {', '.join(cols)} "
+                     f"FROM temp.stage_{t} WHERE true ORDER BY rowid" + conflict_sql(t, cols))
+    conn.commit()
+
+def bump_guild_config(conn: sqlite3.Connection, guild_id: int, before: int):
+    # Other processes only drop a cached config when the poller sees a higher version written
+    # since its last poll, so the imported (or, after a replace, reset) row must come out above the
+    # version they may hold, with a fresh updated_at.
+    conn.execute("INSERT INTO guild_config(guild_id, version, settings, updated_at) VALUES(?,?,'{}',?) "
+                 "ON CONFLICT(guild_id) DO UPDATE SET version=MAX(guild_config.version, excluded.version), "
+                 "updated_at=excluded.updated_at",
+                 (guild_id, before + 1, datetime.utcnow().isoformat()))
+    conn.commit()
+
+def upsert_sql(table: str, cols: list) -> str:
+    return f"INSERT INTO {table}({', '.join(cols)}) VALUES({','.join('?' * len(cols))})" + conflict_sql(table, cols)
+
+def conflict_sql(table: str, cols: list) -> str:
+    key = UPSERTS[table]
+    if not key:
+        return ""
+    updates = [c for c in cols if c not in key]
+    if updates:
+        return f" ON CONFLICT({', '.join(key)}) DO UPDATE SET " + ", ".join(f"{c}=excluded.{c}" for c in updates)
+    return f" ON CONFLICT({', '.join(key)}) DO NOTHING"
+
+def snapshot_db(src_path: str, dest_path: str) -> int:
+    # SQLite online backup from a dedicated connection: with the bot's DB in WAL mode this is a
+    # single consistent read that never blocks the bot's writer. Returns the page count copied.
+    tmp_path = dest_path + ".part"
+    src = sqlite3.connect(src_path, timeout=30)
+    dst = sqlite3.connect(tmp_path)
+    try:
+        src.backup(dst)
+        pages = dst.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp_path, dest_path)
+    return pages
+
+# -------------------------
+# CLI
+# -------------------------
+def print_rate(action: str, counts: dict, elapsed: float):
+    total = sum(counts.values())
+    detail = ", ".join(f"{t}={n:,}" for t, n in counts.items())
+    print(f"{action} {total:,} rows in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} rows/s): {detail}",
+          file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bloop guild economy export/import/snapshot")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("export", help="stream one guild out as NDJSON")
+    p.add_argument("--db", default="bloop.sqlite3")
+    p.add_argument("--guild", type=int, required=True)
+    p.add_argument("-o", "--out", default="-")
+    p.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    p = sub.add_parser("import", help="load an NDJSON export into a guild")
+    p.add_argument("--db", default="bloop.sqlite3")
+    p.add_argument("-i", "--input", default="-")
+    p.add_argument("--guild", type=int, help="target guild id (default: the exported one)")
+    p.add_argument("--replace", action="store_true", help="delete the target guild's rows first")
+    p.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    p.add_argument("--live", action="store_true", help="commit per chunk (bot running on the same DB); --replace always stages and swaps")
+
+    p = sub.add_parser("snapshot", help="hot copy of the whole database (online backup API)")
+    p.add_argument("--db", default="bloop.sqlite3")
+    p.add_argument("-o", "--out", required=True)
+
+    args = parser.parse_args(argv)
+    t0 = time.perf_counter()
+    if args.cmd == "snapshot":
+        pages = snapshot_db(args.db, args.out)
+        print(f"snapshot {pages:,} pages → {args.out} in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+        return 0
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if args.cmd == "export":
+            fp = open_stream(args.out, "w")
+            try:
+                counts = export_guild(conn, args.guild, fp, args.chunk_size)
+            finally:
+                if fp is not sys.stdout:
+                    fp.close()
+            print_rate("exported", counts, time.perf_counter() - t0)
+        else:
+            fp = open_stream(args.input, "r")
+            try:
+                counts = import_guild(conn, fp, args.guild, args.replace, args.chunk_size, args.live, trusted=True)
+            finally:
+                if fp is not sys.stdin:
+                    fp.close()
+            print_rate("imported", counts, time.perf_counter() - t0)
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# Bloop — incremental per-guild economy statistics.
+#
+# Aggregates are updated from each balance change (old → new) as it happens, so answering
+# "how much money exists here" or "how unequal is it" never scans the users table:
+#   supply, holders   total money and number of accounts above zero
+#   histogram         count, sum and observed min/max of balances per power-of-two bucket;
+#                     percentiles and Gini are read off its 64 buckets, so every query is O(1)
+#   flows             money credited / debited per source (daily, games, gifts, loans)
+#
+# Balance aggregates are seeded from the database the first time a guild is queried and then
+# re-checked against it by a periodic compaction (main.compact_economy_stats). Flows are counted
+# from the first event and flushed to the economy_flows table by the same job.
+#
+# Only the standard library is used.
+
+BUCKETS = 64  # bucket k holds balances in [2**(k-1), 2**k); balances are at most 63 bits
+
+def bucket(balance: int) -> int:
+    return min(balance.bit_length(), BUCKETS - 1)
+
+class GuildStats:
+    def __init__(self):
+        self.seeded = False
+        self.supply = 0
+        self.holders = 0
+        self.counts = [0] * BUCKETS
+        self.sums = [0] * BUCKETS
+        # smallest/largest balance seen in each bucket: widened on insert, reset when the bucket
+        # empties or on rebuild, so estimates stay inside the balances that actually exist
+        self.mins = [0] * BUCKETS
+        self.maxs = [0] * BUCKETS
+        self.flows = {}  # source -> [credited, debited], persisted totals included
+        self.unflushed = {}  # source -> [credited, debited] not yet written to the database
+
+    def _account(self, balance: int, sign: int):
+        self.supply += sign * balance
+        if balance > 0:
+            b = bucket(balance)
+            if sign > 0:
+                first = not self.counts[b]
+                self.mins[b] = balance if first else min(self.mins[b], balance)
+                self.maxs[b] = balance if first else max(self.maxs[b], balance)
+            self.counts[b] += sign
+            self.sums[b] += sign * balance
+            self.holders += sign
+            if not self.counts[b]:
+                self.mins[b] = self.maxs[b] = 0
+
+    def record(self, source: str, old: int, new: int):
+        if self.seeded:
+            self._account(old, -1)
+            self._account(new, 1)
+        delta = new - old
+        if delta:
+            i = 0 if delta > 0 else 1
+            self.flows.setdefault(source, [0, 0])[i] += abs(delta)
+            self.unflushed.setdefault(source, [0, 0])[i] += abs(delta)
+
+    def snapshot(self) -> tuple:
+        return self.supply, self.holders, tuple(self.counts), tuple(self.sums)
+
+    def rebuild(self, balances) -> bool:
+        # replace the balance aggregates; True if a seeded guild had drifted from the database
+        before = self.snapshot()
+        self.supply = self.holders = 0
+        self.counts = [0] * BUCKETS
+        self.sums = [0] * BUCKETS
+        self.mins = [0] * BUCKETS
+        self.maxs = [0] * BUCKETS
+        for bal in balances:
+            self._account(bal, 1)
+        drifted = self.seeded and self.snapshot() != before
+        self.seeded = True
+        return drifted
+
+    def load_flows(self, persisted: dict):
+        # persisted totals plus whatever was counted before they were read
+        self.flows = {s: [c, d] for s, (c, d) in persisted.items()}
+        for source, (c, d) in self.unflushed.items():
+            f = self.flows.setdefault(source, [0, 0])
+            f[0] += c
+            f[1] += d
+
+    def take_unflushed(self) -> dict:
+        pending, self.unflushed = self.unflushed, {}
+        return pending
+
+    def restore_unflushed(self, pending: dict):
+        # a flush failed; keep the deltas for the next one
+        for source, (c, d) in pending.items():
+            u = self.unflushed.setdefault(source, [0, 0])
+            u[0] += c
+            u[1] += d
+
+    def percentile(self, p: float) -> int:
+        # balance at the p-th percentile of holders, interpolated linearly between the smallest
+        # and largest balance seen in its bucket
+        if not self.holders:
+            return 0
+        target = p / 100 * self.holders
+        seen = 0
+        for b in range(1, BUCKETS):
+            c = self.counts[b]
+            if c and seen + c >= target:
+                lo, hi = self.mins[b], self.maxs[b]
+                return int(lo + (hi - lo) * max(0.0, target - seen) / c)
+            seen += c
+        return max(self.maxs)
+
+    def gini(self) -> float:
+        # Gini of holders' balances from the grouped histogram: the between-bucket term plus each
+        # bucket's own spread, taken as uniform over its observed [min, max]
+        total = sum(self.sums)
+        if self.holders < 2 or total <= 0:
+            return 0.0
+        g, cum = 1.0, 0
+        for b, (c, s) in enumerate(zip(self.counts, self.sums)):
+            if c:
+                share = s / total
+                g -= c / self.holders * (2 * cum + s) / total
+                g += c / self.holders * share * (self.maxs[b] - self.mins[b]) / (3 * (self.maxs[b] + self.mins[b]))
+                cum += s
+        return max(0.0, g)
+
+class EconomyStats:
+    def __init__(self):
+        self.guilds = {}  # guild_id -> GuildStats
+        self.corrections = 0  # compactions that found an aggregate out of step with the database
+
+    def guild(self, guild_id: int) -> GuildStats:
+        g = self.guilds.get(guild_id)
+        if g is None:
+            g = self.guilds[guild_id] = GuildStats()
+        return g
+
+    def record(self, guild_id: int, source: str, changes):
+        # changes: [(old_balance, new_balance)] for each account a write touched
+        g = self.guild(guild_id)
+        for old, new in changes:
+            g.record(source, old, new)
+
+    def forget(self, guild_id: int):
+        self.guilds.pop(guild_id, None)
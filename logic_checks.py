@@ -0,0 +1,179 @@
+# Direct checks for the bot's in-memory logic (no Discord connection, no database).
+#   python logic_checks.py
+#
+# Covers the economy statistics math, wheel parsing/spinning, embed merging, the member name
+# cache and matchmaking. Exits non-zero if any section fails. Needs discord.py installed
+# (main is imported, not run).
+
+import asyncio
+import random
+import sys
+import types
+
+import discord
+
+import main
+from economy_stats import GuildStats
+
+def check(cond, what):
+    if not cond:
+        raise AssertionError(what)
+
+def exact_percentile(values: list, p: float) -> int:
+    v = sorted(values)
+    return v[min(len(v) - 1, int(p / 100 * len(v)))]
+
+def exact_gini(values: list) -> float:
+    v = sorted(values)
+    n = len(v)
+    return sum((2 * i - n + 1) * x for i, x in enumerate(v)) / (n * sum(v))
+
+def economy_stats_checks():
+    uniform = list(range(1, 10_001))
+    g = GuildStats()
+    g.rebuild(uniform)
+    check(g.supply == sum(uniform) and g.holders == len(uniform), "rebuild totals")
+    for p in (50, 90, 99):
+        est, real = g.percentile(p), exact_percentile(uniform, p)
+        check(1 <= est <= 10_000, f"p{p} inside the real range")
+        check(abs(est - real) <= real * 0.01, f"p{p} of a uniform spread is close ({est} vs {real})")
+    check(abs(g.gini() - exact_gini(uniform)) < 0.01, "Gini of a uniform spread")
+
+    rng = random.Random(7)
+    skewed = [int(rng.paretovariate(1.2) * 100) for _ in range(20_000)]
+    g = GuildStats()
+    g.rebuild(skewed)
+    check(all(min(skewed) <= g.percentile(p) <= max(skewed) for p in (1, 50, 99, 100)), "skewed percentiles in range")
+    check(abs(g.gini() - exact_gini(skewed)) < 0.03, "Gini of a skewed spread")
+
+    g = GuildStats()
+    check(g.percentile(50) == 0 and g.gini() == 0.0, "empty guild")
+    g.rebuild([100, 300])
+    g.record("games", 100, 0)
+    check((g.supply, g.holders) == (300, 1), "record moves an account out")
+    check(g.percentile(50) == 300, "remaining holder is the median")
+    g.record("daily", 0, 50)
+    check(g.flows == {"games": [0, 100], "daily": [50, 0]}, "flows by source")
+    check(not g.rebuild([300, 50]), "in-step aggregates don't count as drift")
+    check(g.rebuild([300]), "drift is reported")
+    check(g.take_unflushed() == {"games": [0, 100], "daily": [50, 0]} and g.take_unflushed() == {},
+          "unflushed deltas are handed out once")
+
+def wheel_checks():
+    check(main.parse_wheel("0:20, 0.5:30,1:25") == [[0, 20.0], [0.5, 30.0], [1, 25.0]], "parse_wheel")
+    for bad in ("", "1", "1:2:3", "x:1", "-1:5", "101:5", "2:0", ",".join(["1:1"] * 21)):
+        try:
+            main.parse_wheel(bad)
+        except ValueError:
+            continue
+        check(False, f"parse_wheel rejects {bad!r}")
+    cfg = main.GuildConfig(1, {"wheel": [[0, 1.0], [2, 1.0], [5, 2.0]]})
+    check(cfg.spin(0.0) == 0 and cfg.spin(0.2499) == 0, "first segment")
+    check(cfg.spin(0.26) == 2 and cfg.spin(0.4999) == 2, "second segment")
+    check(cfg.spin(0.51) == 5 and cfg.spin(0.999999) == 5, "last segment")
+    rng = random.Random(1)
+    spins = [cfg.spin(rng.random()) for _ in range(40_000)]
+    check(abs(spins.count(5) / len(spins) - 0.5) < 0.02, "spins follow the weights")
+    try:
+        main.clean_overrides({"daily_amount": "5"})
+        check(False, "clean_overrides rejects strings")
+    except ValueError:
+        pass
+    check(main.clean_overrides({"wheel": [[1, 2]]}) == {"wheel": [[1, 2.0]]}, "clean_overrides wheel")
+
+def merge_checks():
+    def item(content=None, embed=None, image=None):
+        return {"content": content, "embed": embed, "image": image}
+    win = discord.Embed(title="Win", description="you won", color=discord.Color.gold())
+    group = [item("rolls"), item(embed=win), item(image="https://example.invalid/a.gif")]
+    merged = main.merge_embeds(group, drop_images=False)
+    check(merged.title == "Win" and merged.color == discord.Color.gold(), "title/colour from the first embed")
+    check(merged.description == "rolls\n\nyou won", "text parts joined in order")
+    check(merged.image.url == "https://example.invalid/a.gif", "image kept")
+    check(main.merge_embeds(group, drop_images=True).image.url is None, "image dropped under backpressure")
+
+def member_cache_checks():
+    cache = main.MemberNameCache(maxsize=2, ttl=60)
+    cache.put(1, 10, "a")
+    cache.put(1, 11, "b")
+    check(cache.get(1, 10) == "a", "hit")
+    cache.put(1, 12, "c")  # evicts 11, the least recently used
+    check(cache.get(1, 11) is None and cache.get(1, 10) == "a", "LRU eviction")
+    cache.forget(1, 10)
+    check(cache.get(1, 10) is None, "forget")
+    stale = main.MemberNameCache(ttl=-1)
+    stale.put(1, 10, "a")
+    check(stale.get(1, 10) is None, "expired entries miss")
+
+    class Guild:
+        id = 1
+        def get_member(self, uid):
+            return None
+        async def query_members(self, user_ids, limit, cache):
+            return [types.SimpleNamespace(id=uid, display_name=f"m{uid}") for uid in user_ids if uid != 99]
+    cache = main.MemberNameCache(maxsize=10, ttl=60)
+    names = asyncio.run(cache.resolve(Guild(), [5, 99]))
+    check(names == {5: "m5", 99: "<@99>"}, "resolve fetches misses and falls back to a mention")
+    check(cache.get(1, 5) == "m5", "resolved names are cached")
+
+async def matchmaking_checks():
+    class Perms:
+        def __init__(self, ok):
+            self.view_channel = self.send_messages = ok
+    class Channel:
+        def __init__(self, cid, blocked=()):
+            self.id, self.blocked, self.sent = cid, set(blocked), []
+        def permissions_for(self, member):
+            return Perms(member.id not in self.blocked)
+        async def send(self, content=None, embed=None):
+            self.sent.append(content or embed.description)
+    def member(uid):
+        return types.SimpleNamespace(id=uid, mention=f"<@{uid}>")
+
+    mm = main.Matchmaker()
+    lobby, side = Channel(1), Channel(2)
+    check(mm.join(1, "dice", 10, member(1), lobby) == (None, None), "first player waits")
+    check(mm.join(1, "dice", 100, member(2), lobby) == (None, None), "far-apart bets don't pair")
+    other, ch = mm.join(1, "dice", 12, member(3), lobby)
+    check(other is not None and other.member.id == 1 and ch is lobby, "same bracket pairs")
+    check(mm.waiting(1, 1) is None and mm.matches["dice"] == 1, "paired player leaves the queue")
+
+    check(mm.leave(1, 2) is not None and mm.waiting(1, 2) is None, "leave")
+    check(mm.join(1, "dice", 100, member(4), lobby) == (None, None), "left players aren't matched")
+    check(mm.join(2, "dice", 100, member(5), lobby) == (None, None), "queues are per guild")
+
+    private = Channel(3, blocked={7})
+    mm.join(1, "ttt", 0, member(6), private)
+    other, ch = mm.join(1, "ttt", 0, member(7), side)
+    check(other.member.id == 6 and ch is side, "match moves to a channel both can use")
+
+    mm.join(1, "ttt", 0, member(8), side)
+    mm.expire(mm.waiting(1, 8))
+    await asyncio.sleep(0.01)
+    check(mm.timeouts["ttt"] == 1 and mm.waiting(1, 8) is None, "expiry removes the entry")
+    check(any("no ttt opponent" in m for m in side.sent), "expiry tells the player")
+    for e in list(mm.by_user.values()):
+        mm.remove(e)
+
+SECTIONS = [
+    ("economy_stats", economy_stats_checks),
+    ("wheel", wheel_checks),
+    ("merge_embeds", merge_checks),
+    ("member_names", member_cache_checks),
+    ("matchmaking", lambda: asyncio.run(matchmaking_checks())),
+]
+
+def run():
+    ok = True
+    for name, fn in SECTIONS:
+        try:
+            fn()
+        except AssertionError as e:
+            print(f"{name}: FAIL — {e}")
+            ok = False
+            continue
+        print(f"{name}: ok")
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
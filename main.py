@@ -2,15 +2,30 @@
 # pip install -U discord.py
 
 import os
+import io
+import gzip
 import asyncio
+import bisect
+import hashlib
+import hmac
+import heapq
+import itertools
+import json
+import logging
 import random
 import sqlite3
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
 
+import economy_io
+from economy_stats import EconomyStats
+from storage import BADGE_BITS, SQLiteStorage, storage_from_env
+
 # -------------------------
 # CONFIG
 # -------------------------
@@ -21,111 +36,398 @@ LAMBO_GIF = "https://tenor.com/uxxicB3aCSs.gif"  # fun win gif
 DEFAULT_CURRENCY = "Bloop Coins"
 JOIN_WINDOW_SECONDS = 25  # for multiplayer dice
 GAMBLE_COOLDOWN_SECONDS = 5
+TTT_REWARD = 25
+# spinning wheel: (multiplier, weight); weights needn't sum to 1
+WHEEL = [(0, 0.20), (0.5, 0.30), (1, 0.25), (2, 0.15), (5, 0.08), (10, 0.02)]
 RANDOM_MONEY_COOLDOWN_MIN = 2
+SESSION_ORPHAN_GRACE_SECONDS = 60
+STATS_COMPACT_MINUTES = 10
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
-intents.members = True
-
-bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
+intents.members = True  # still needed for converters and query_members, not for caching
+
+# Gateway cache policy. Nothing here reads the message cache, and members are only needed for
+# converters (which fall back to a gateway query) and leaderboard names (MemberNameCache), so by
+# default neither is kept. Caching every member of a 100k-member guild dominates RSS and startup.
+MEMBER_CACHE = os.environ.get("BLOOP_MEMBER_CACHE", "none")  # none | joined | all
+MAX_MESSAGES = int(os.environ.get("BLOOP_MAX_MESSAGES", 0)) or None  # discord.py's default is 1000
+CHUNK_GUILDS_AT_STARTUP = os.environ.get("BLOOP_CHUNK_GUILDS", "0") == "1"
+MEMBER_NAME_CACHE_SIZE = int(os.environ.get("BLOOP_MEMBER_NAME_CACHE", 5000))
+MEMBER_NAME_TTL_SECONDS = 15 * 60
+
+def member_cache_flags(policy: str = MEMBER_CACHE) -> discord.MemberCacheFlags:
+    if policy == "all":
+        return discord.MemberCacheFlags.from_intents(intents)
+    if policy == "joined":
+        return discord.MemberCacheFlags(joined=True, voice=False)
+    return discord.MemberCacheFlags.none()
+
+bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents,
+                   member_cache_flags=member_cache_flags(),
+                   chunk_guilds_at_startup=CHUNK_GUILDS_AT_STARTUP,
+                   max_messages=MAX_MESSAGES)
 tree = bot.tree
 
-DB_PATH = "bloop.sqlite3"
-conn = sqlite3.connect(DB_PATH)
-cur = conn.cursor()
+DB_PATH = os.environ.get("BLOOP_DB_PATH", "bloop.sqlite3")
+store = None  # Storage backend, opened by open_storage() at startup, not at import time
 
 # -------------------------
 # DATABASE
 # -------------------------
-def db_setup():
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users(
-        guild_id INTEGER,
-        user_id INTEGER,
-        balance INTEGER DEFAULT 0,
-        last_daily TEXT,
-        badges TEXT DEFAULT '',
-        PRIMARY KEY(guild_id, user_id)
-    );
-    """)
-    cur.execute(f"""
-    CREATE TABLE IF NOT EXISTS servers(
-        guild_id INTEGER PRIMARY KEY,
-        currency_name TEXT DEFAULT '{DEFAULT_CURRENCY}',
-        debt INTEGER DEFAULT 0,
-        treasury INTEGER DEFAULT 0
-    );
-    """)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS loans(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        guild_id INTEGER,
-        lender_id INTEGER,
-        borrower_id INTEGER,
-        amount INTEGER,
-        status TEXT, -- pending, accepted, rejected
-        created_at TEXT
-    );
-    """)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS cooldowns(
-        guild_id INTEGER,
-        user_id INTEGER,
-        name TEXT,
-        next_time TEXT,
-        PRIMARY KEY(guild_id, user_id, name)
-    );
-    """)
-    conn.commit()
-
-def get_currency(guild_id: int) -> str:
-    cur.execute("SELECT currency_name FROM servers WHERE guild_id=?", (guild_id,))
-    row = cur.fetchone()
-    return row[0] if row and row[0] else DEFAULT_CURRENCY
-
-def ensure_server_row(guild_id: int):
-    cur.execute("INSERT OR IGNORE INTO servers(guild_id) VALUES(?)", (guild_id,))
-    conn.commit()
-
-def ensure_user_row(guild_id: int, user_id: int):
-    cur.execute("INSERT OR IGNORE INTO users(guild_id, user_id) VALUES(?,?)", (guild_id, user_id))
-    conn.commit()
-
-def add_balance(guild_id: int, user_id: int, delta: int):
-    ensure_user_row(guild_id, user_id)
-    cur.execute("UPDATE users SET balance = COALESCE(balance,0) + ? WHERE guild_id=? AND user_id=?", (delta, guild_id, user_id))
-    conn.commit()
-
-def get_balance(guild_id: int, user_id: int) -> int:
-    ensure_user_row(guild_id, user_id)
-    cur.execute("SELECT balance FROM users WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-    row = cur.fetchone()
-    return int(row[0]) if row else 0
-
-def set_cooldown(guild_id: int, user_id: int, name: str, seconds: int):
-    next_time = (datetime.utcnow() + timedelta(seconds=seconds)).isoformat()
-    cur.execute("""
-        INSERT INTO cooldowns(guild_id, user_id, name, next_time)
-        VALUES(?,?,?,?)
-        ON CONFLICT(guild_id, user_id, name) DO UPDATE SET next_time=excluded.next_time
-    """, (guild_id, user_id, name, next_time))
-    conn.commit()
-
-def check_cooldown(guild_id: int, user_id: int, name: str):
-    cur.execute("SELECT next_time FROM cooldowns WHERE guild_id=? AND user_id=? AND name=?",
-                (guild_id, user_id, name))
-    row = cur.fetchone()
-    if not row or not row[0]:
-        return True, 0
-    nt = datetime.fromisoformat(row[0])
+# All persistence lives behind storage.Storage (SQLite by default, Postgres when
+# BLOOP_DATABASE_URL is set). These wrappers are what the commands call; the money-moving ones
+# also feed each (old, new) balance into economy_stats, tagged with where the money came from,
+# and carry the account's queued badges (see BADGES) in the same write.
+async def open_storage(path: str = None):
+    global store
+    store = SQLiteStorage(path) if path else storage_from_env(DB_PATH)
+    await store.setup()
+    return store
+
+async def get_currency(guild_id: int) -> str:
+    return await store.get_currency(guild_id) or DEFAULT_CURRENCY
+
+async def get_balance(guild_id: int, user_id: int) -> int:
+    return await store.get_balance(guild_id, user_id)
+
+async def with_badges(guild_id: int, user_id: int, write, extra: int = 0):
+    # write(bits) is a balance write returning None if it didn't happen; queued badges (plus
+    # `extra`) ride along and go back in the queue if the write fails
+    queued = badges.take(guild_id, user_id)
+    if (queued | extra) and not badges.known(guild_id, user_id):
+        # first badge event for this account since startup (or since it left the cache): learn
+        # what it already owns so nothing is counted as earned twice
+        badges.learn(guild_id, user_id, await store.get_badges(guild_id, user_id))
+        queued &= ~badges.owned[(guild_id, user_id)]
+    try:
+        result = await write(queued | extra)
+    except Exception:
+        badges.put_back(guild_id, user_id, queued)
+        raise
+    if result is None:
+        badges.put_back(guild_id, user_id, queued)
+    else:
+        badges.confirm(guild_id, user_id, queued | extra)
+    return result
+
+async def add_balance(guild_id: int, user_id: int, delta: int, source: str = "games") -> int:
+    bal = await with_badges(guild_id, user_id, lambda bits: store.add_balance(guild_id, user_id, delta, bits))
+    economy_stats.record(guild_id, source, [(bal - delta, bal)])
+    return bal
+
+async def try_debit(guild_id: int, user_id: int, amount: int, source: str = "games") -> bool:
+    # atomic "balance >= amount" check-and-debit; False means nothing was taken
+    bal = await with_badges(guild_id, user_id, lambda bits: store.try_debit(guild_id, user_id, amount, bits))
+    if bal is None:
+        return False
+    economy_stats.record(guild_id, source, [(bal + amount, bal)])
+    return True
+
+async def transfer(guild_id: int, src_id: int, dst_id: int, amount: int, source: str = "gifts") -> bool:
+    moved = await store.transfer(guild_id, src_id, dst_id, amount)
+    if moved is None:
+        return False
+    if src_id != dst_id:
+        economy_stats.record(guild_id, source, [(moved[0] + amount, moved[0]), (moved[1] - amount, moved[1])])
+    return True
+
+async def accept_loan(loan_id: int, guild_id: int, amount: int) -> bool:
+    moved = await store.accept_loan(loan_id)
+    if moved is None:
+        return False
+    economy_stats.record(guild_id, "loans", [(moved[0] + amount, moved[0]), (moved[1] - amount, moved[1])])
+    return True
+
+async def repay_loan(guild_id: int, borrower_id: int, lender_id: int = None):
+    # (loan_id, lender_id, amount, borrower_balance, lender_balance) or None
+    repaid = await with_badges(guild_id, borrower_id,
+                               lambda bits: store.repay_loan(guild_id, borrower_id, lender_id, bits),
+                               extra=BADGE_BITS["loan_repaid"])
+    if repaid is None:
+        return None
+    _, lender_id, amount, borrower_bal, lender_bal = repaid
+    economy_stats.record(guild_id, "loans", [(borrower_bal + amount, borrower_bal), (lender_bal - amount, lender_bal)])
+    return repaid
+
+async def claim_cooldown(guild_id: int, user_id: int, name: str, seconds: int):
+    # check-and-set in one statement, so two commands sent together can't both get through
     now = datetime.utcnow()
-    if now >= nt:
+    nt = await store.claim_cooldown(guild_id, user_id, name, now, now + timedelta(seconds=seconds))
+    if nt is None:
         return True, 0
-    remaining = int((nt - now).total_seconds())
-    return False, remaining
+    return False, max(0, int((nt - now).total_seconds()))
+
+# -------------------------
+# PER-GUILD CONFIG
+# -------------------------
+# The economy constants above are defaults; admins override them per guild with !bloopconfig.
+# Commands read settings from memory: a guild's row is loaded once, replaced in place when it's
+# changed here, and dropped when the poller sees a newer version written by another process.
+CONFIG_POLL_SECONDS = 30
+JOIN_WINDOW_MAX_SECONDS = 300
+
+# key -> (min, max) for the integer settings; "wheel" is parsed separately
+CONFIG_LIMITS = {
+    "daily_amount": (0, 1_000_000),
+    "random_money_max": (0, 1_000_000),
+    "join_window_seconds": (5, JOIN_WINDOW_MAX_SECONDS),
+    "gamble_cooldown_seconds": (0, 3600),
+    "ttt_reward": (0, 1_000_000),
+}
+
+def default_settings() -> dict:
+    return {
+        "daily_amount": DAILY_AMOUNT,
+        "random_money_max": RANDOM_MONEY_MAX,
+        "join_window_seconds": JOIN_WINDOW_SECONDS,
+        "gamble_cooldown_seconds": GAMBLE_COOLDOWN_SECONDS,
+        "ttt_reward": TTT_REWARD,
+        "wheel": [list(seg) for seg in WHEEL],
+    }
+
+class GuildConfig:
+    # Immutable snapshot of one guild's settings; derived tables are built here, once per version.
+    def __init__(self, version: int, overrides: dict):
+        self.version = version
+        self.overrides = overrides
+        settings = {**default_settings(), **overrides}
+        self.daily_amount = settings["daily_amount"]
+        self.random_money_max = settings["random_money_max"]
+        self.join_window_seconds = settings["join_window_seconds"]
+        self.gamble_cooldown_seconds = settings["gamble_cooldown_seconds"]
+        self.ttt_reward = settings["ttt_reward"]
+        self.wheel = [(m, w) for m, w in settings["wheel"]]
+        total = sum(w for _, w in self.wheel)
+        self.wheel_cumulative = list(itertools.accumulate(w / total for _, w in self.wheel))
+
+    def spin(self, r: float):
+        # r in [0, 1) → multiplier; binary search over the cumulative weights
+        i = bisect.bisect_left(self.wheel_cumulative, r)
+        return self.wheel[min(i, len(self.wheel) - 1)][0]
+
+def parse_wheel(text: str) -> list:
+    # "0:20,0.5:30,1:25" → [[0, 20.0], [0.5, 30.0], [1, 25.0]]
+    wheel = []
+    for part in text.replace(" ", "").split(","):
+        if part.count(":") != 1:
+            raise ValueError(f"expected multiplier:weight, got {part!r}")
+        m, w = (float(x) for x in part.split(":"))
+        if not (0 <= m <= 100 and 0 < w <= 1_000_000):
+            raise ValueError("multipliers must be 0–100 and weights positive")
+        wheel.append([int(m) if m.is_integer() else m, w])
+    if not 1 <= len(wheel) <= 20:
+        raise ValueError("the wheel needs 1–20 segments")
+    return wheel
+
+def parse_setting(key: str, value: str):
+    if key == "wheel":
+        return parse_wheel(value)
+    lo, hi = CONFIG_LIMITS[key]
+    n = int(value)
+    if not lo <= n <= hi:
+        raise ValueError(f"{key} must be between {lo:,} and {hi:,}")
+    return n
+
+def clean_overrides(raw) -> dict:
+    # stored or imported overrides → the same values parse_setting would produce; ValueError otherwise
+    if not isinstance(raw, dict):
+        raise ValueError("settings must be a JSON object")
+    clean = {}
+    for key, value in raw.items():
+        if key == "wheel":
+            if not isinstance(value, list) or not all(isinstance(seg, list) and len(seg) == 2 for seg in value):
+                raise ValueError("wheel must be a list of [multiplier, weight] pairs")
+            clean[key] = parse_wheel(",".join(f"{m}:{w}" for m, w in value))
+        elif key in CONFIG_LIMITS:
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ValueError(f"{key} must be an integer")
+            clean[key] = parse_setting(key, str(value))
+        else:
+            raise ValueError(f"unknown setting {key!r}")
+    return clean
+
+class GuildConfigCache:
+    def __init__(self):
+        self.entries = {}  # guild_id -> GuildConfig
+        self.loads = 0
+        self.polled_at = datetime.utcnow()
+
+    async def get(self, guild_id: int) -> GuildConfig:
+        cfg = self.entries.get(guild_id)
+        if cfg is not None:
+            return cfg
+        row = await store.get_guild_config(guild_id)
+        self.loads += 1
+        cfg = GuildConfig(row[0], self.load_overrides(guild_id, row[1])) if row else GuildConfig(0, {})
+        # an update() may have landed while we were reading
+        current = self.entries.get(guild_id)
+        if current is None or current.version < cfg.version:
+            self.entries[guild_id] = cfg
+        return self.entries[guild_id]
+
+    def load_overrides(self, guild_id: int, text: str) -> dict:
+        # a bad row (hand-edited DB, old import) must not break every command in the guild
+        try:
+            return clean_overrides(json.loads(text))
+        except ValueError as e:
+            print(f"Ignoring invalid config for guild {guild_id}: {e}")
+            return {}
+
+    async def update(self, guild_id: int, changes: dict) -> GuildConfig:
+        # changes: key -> new value, or None to go back to the default.
+        # Applied to the stored row with a compare-and-set on its version, so a concurrent
+        # update from another process is re-read and kept rather than overwritten.
+        while True:
+            row = await store.get_guild_config(guild_id)
+            version, overrides = (row[0], self.load_overrides(guild_id, row[1])) if row else (0, {})
+            for key, value in changes.items():
+                if value is None:
+                    overrides.pop(key, None)
+                else:
+                    overrides[key] = value
+            new_version = await store.set_guild_config(guild_id, json.dumps(overrides), version)
+            if new_version is not None:
+                break
+        cfg = GuildConfig(new_version, overrides)
+        current = self.entries.get(guild_id)
+        if current is None or current.version < new_version:
+            self.entries[guild_id] = cfg
+        return self.entries[guild_id]
+
+    def forget(self, guild_id: int):
+        self.entries.pop(guild_id, None)
+
+    async def poll(self):
+        # drop entries another process has bumped; overlap the window a little for clock skew
+        # (polled_at only moves on success, so a failed poll's window is covered by the next one)
+        now = datetime.utcnow()
+        for guild_id, version in await store.changed_guild_configs(self.polled_at - timedelta(seconds=5)):
+            cfg = self.entries.get(guild_id)
+            if cfg is not None and cfg.version < version:
+                self.forget(guild_id)
+        self.polled_at = now
 
-db_setup()
+guild_configs = GuildConfigCache()
+
+# -------------------------
+# ECONOMY STATS
+# -------------------------
+# Running per-guild aggregates (see economy_stats.py). A guild is seeded from the DB the first
+# time someone asks for its stats; after that !bloopstats reads memory only.
+economy_stats = EconomyStats()
+stats_lock = asyncio.Lock()  # seeding and compaction each read the DB across awaits
+
+async def guild_stats(guild_id: int):
+    g = economy_stats.guild(guild_id)
+    if not g.seeded:
+        async with stats_lock:
+            if not g.seeded:
+                g.load_flows(await store.get_flows(guild_id))
+                g.rebuild(await store.nonzero_balances(guild_id))
+    return g
+
+async def flush_flows(guild_id: int, g):
+    pending = g.take_unflushed()
+    if not pending:
+        return
+    try:
+        await store.add_flows(guild_id, pending)
+    except Exception:
+        g.restore_unflushed(pending)
+        raise
+
+# -------------------------
+# BADGES
+# -------------------------
+# Rules run on game/economy events as they happen; nothing scans users. An earned badge is queued
+# and written by that account's next balance write (storage ORs the bits into the same UPDATE), so
+# badges never cost a commit of their own. A queued badge is lost if the bot stops before that
+# write; its rule fires again the next time the event happens. "Top 10" is only awarded from the
+# board itself, when it is read. Owned bits and win streaks are kept for the most recently active
+# BADGE_CACHE_SIZE accounts; an account's owned bits are read from the DB the first time it earns
+# something after startup or eviction.
+BADGES = [  # key, emoji, label; bit numbers live in storage.BADGE_BITS
+    ("first_blackjack", "🃏", "First blackjack"),
+    ("win_streak_10", "🔥", "10 wins in a row"),
+    ("top_10", "🏆", "Top 10 on the board"),
+    ("loan_repaid", "🤝", "Repaid a loan"),
+]
+WIN_STREAK_BADGE = 10
+BOARD_SIZE = 10
+BADGE_CACHE_SIZE = int(os.environ.get("BLOOP_BADGE_CACHE", 50000))
+
+class BadgeEngine:
+    def __init__(self, maxsize: int = BADGE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.pending = {}  # (guild_id, user_id) -> bits earned but not yet written
+        self.owned = OrderedDict()  # (guild_id, user_id) -> bits stored in the DB, LRU
+        self.streaks = OrderedDict()  # (guild_id, user_id) -> consecutive game wins, LRU
+        self.awarded = 0
+
+    def _put(self, d: OrderedDict, k, value):
+        d[k] = value
+        d.move_to_end(k)
+        while len(d) > self.maxsize:
+            d.popitem(last=False)
+
+    def known(self, guild_id: int, user_id: int) -> bool:
+        return (guild_id, user_id) in self.owned
+
+    def learn(self, guild_id: int, user_id: int, bits: int):
+        self._put(self.owned, (guild_id, user_id), bits)
+
+    def earn(self, guild_id: int, user_id: int, key: str):
+        k = (guild_id, user_id)
+        bit = BADGE_BITS[key]
+        if (self.owned.get(k, 0) | self.pending.get(k, 0)) & bit:
+            return
+        self.pending[k] = self.pending.get(k, 0) | bit
+
+    def take(self, guild_id: int, user_id: int) -> int:
+        return self.pending.pop((guild_id, user_id), 0)
+
+    def put_back(self, guild_id: int, user_id: int, bits: int):
+        if bits:
+            k = (guild_id, user_id)
+            self.pending[k] = self.pending.get(k, 0) | bits
+
+    def confirm(self, guild_id: int, user_id: int, bits: int):
+        if bits:
+            k = (guild_id, user_id)
+            owned = self.owned.get(k, 0)
+            self.awarded += bin(bits & ~owned).count("1")
+            self._put(self.owned, k, owned | bits)
+
+    # --- rules (events) ---
+    def game_result(self, guild_id: int, user_id: int, won: bool):
+        k = (guild_id, user_id)
+        if not won:
+            self.streaks.pop(k, None)
+            return
+        self._put(self.streaks, k, self.streaks.get(k, 0) + 1)
+        if self.streaks[k] >= WIN_STREAK_BADGE:
+            self.earn(guild_id, user_id, "win_streak_10")
+
+    def natural_blackjack(self, guild_id: int, user_id: int):
+        self.earn(guild_id, user_id, "first_blackjack")
+
+    def board_read(self, guild_id: int, rows: list):
+        # rows: the actual top BOARD_SIZE (user_id, balance) from the database
+        for uid, bal in rows[:BOARD_SIZE]:
+            if bal > 0:
+                self.earn(guild_id, uid, "top_10")
+
+    def forget(self, guild_id: int):
+        for d in (self.pending, self.owned, self.streaks):
+            for k in [k for k in d if k[0] == guild_id]:
+                del d[k]
+
+    def describe(self, bits: int) -> list:
+        return [f"{emoji} {label}" for key, emoji, label in BADGES if bits & BADGE_BITS[key]]
+
+badges = BadgeEngine()
 
 # -------------------------
 # UTILS
@@ -137,10 +439,225 @@ def is_adminish(member: discord.Member) -> bool:
 def fmt(amount: int, currency: str) -> str:
     return f"{amount:,} {currency}"
 
-async def send_win_gif(channel: discord.TextChannel, note: str = "You won!"):
+class MemberNameCache:
+    # (guild_id, user_id) -> display name, LRU with a TTL. Names that aren't cached are looked up
+    # for a whole batch with one gateway member request instead of keeping every member in memory.
+    def __init__(self, maxsize: int = MEMBER_NAME_CACHE_SIZE, ttl: float = MEMBER_NAME_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, name)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, guild_id: int, user_id: int):
+        key = (guild_id, user_id)
+        hit = self.entries.get(key)
+        if hit is None or hit[0] <= time.monotonic():
+            return None
+        self.entries.move_to_end(key)
+        return hit[1]
+
+    def put(self, guild_id: int, user_id: int, name: str):
+        key = (guild_id, user_id)
+        self.entries[key] = (time.monotonic() + self.ttl, name)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def forget(self, guild_id: int, user_id: int):
+        self.entries.pop((guild_id, user_id), None)
+
+    async def resolve(self, guild: discord.Guild, user_ids) -> dict:
+        names = {}
+        missing = []
+        for uid in user_ids:
+            name = self.get(guild.id, uid)
+            if name is None:
+                member = guild.get_member(uid)  # only hits if a cache policy keeps this member
+                name = member.display_name if member else None
+                if name is not None:
+                    self.put(guild.id, uid, name)
+            if name is None:
+                missing.append(uid)
+            else:
+                names[uid] = name
+        self.hits += len(names)
+        self.misses += len(missing)
+        for i in range(0, len(missing), 100):  # gateway limit per request
+            batch = missing[i:i + 100]
+            try:
+                members = await guild.query_members(user_ids=batch, limit=len(batch), cache=False)
+            except (asyncio.TimeoutError, discord.ClientException):
+                members = []
+            for m in members:
+                self.put(guild.id, m.id, m.display_name)
+                names[m.id] = m.display_name
+        for uid in user_ids:
+            names.setdefault(uid, f"<@{uid}>")  # left the guild, or the request timed out
+        return names
+
+member_names = MemberNameCache()
+
+# -------------------------
+# OUTBOUND MESSAGES
+# -------------------------
+# Game results go through a per-channel queue instead of straight to channel.send():
+#   - nothing is sent to a channel while a click on one of our live views there is still being
+#     answered (acks must land within 3s and share rate-limit headroom with these sends); see
+#     OutboundView
+#   - queued items with the same merge_key (e.g. dice rolls + winner + win GIF) become one embed
+#   - win GIFs are queued as a separate cosmetic item merged into their result; under
+#     backpressure the cosmetic is dropped and only the text is sent
+PRIORITY_RESULT = 0
+PRIORITY_COSMETIC = 1
+OUTBOUND_BACKPRESSURE_DEPTH = 5  # queued messages per channel before cosmetics are dropped
+ACK_WAIT_SECONDS = 3.0
+
+class Outbound:
+    def __init__(self):
+        self.queues = {}  # channel_id -> heap of (priority, seq, item)
+        self.workers = {}  # channel_id -> drain task
+        self.pending_acks = {}  # channel_id -> {interaction_id: (answered event, expiry timer)}
+        self.seq = itertools.count()
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self.rate_limited = 0
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def track_interaction(self, interaction: discord.Interaction):
+        # call from the task that will answer the interaction: released when that task finishes
+        # (the callback has responded by then), or after ACK_WAIT_SECONDS if it is still running
+        ch_id = interaction.channel_id
+        task = asyncio.current_task()
+        if ch_id is None or task is None or interaction.response.is_done():
+            return
+        timer = asyncio.get_running_loop().call_later(ACK_WAIT_SECONDS, self.release, ch_id, interaction.id)
+        self.pending_acks.setdefault(ch_id, {})[interaction.id] = (asyncio.Event(), timer)
+        task.add_done_callback(lambda _: self.release(ch_id, interaction.id))
+
+    def release(self, channel_id: int, interaction_id: int):
+        pending = self.pending_acks.get(channel_id)
+        entry = pending.pop(interaction_id, None) if pending else None
+        if entry is None:
+            return
+        if not pending:
+            del self.pending_acks[channel_id]
+        event, timer = entry
+        timer.cancel()
+        event.set()
+
+    def send(self, channel, content: str = None, *, embed: discord.Embed = None, image: str = None,
+             merge_key=None, priority: int = PRIORITY_RESULT) -> asyncio.Future:
+        # Returns a future for the sent Message (None if dropped or failed); callers needn't await it.
+        fut = asyncio.get_running_loop().create_future()
+        q = self.queues.setdefault(channel.id, [])
+        if len(q) >= OUTBOUND_BACKPRESSURE_DEPTH:
+            if priority == PRIORITY_COSMETIC:
+                self.dropped += 1
+                fut.set_result(None)
+                return fut
+            if image:
+                self.dropped += 1
+                image = None
+        item = {"channel": channel, "content": content, "embed": embed, "image": image,
+                "merge_key": merge_key, "future": fut}
+        heapq.heappush(q, (priority, next(self.seq), item))
+        if channel.id not in self.workers:
+            self.workers[channel.id] = asyncio.create_task(self.drain(channel.id))
+        return fut
+
+    async def wait_for_acks(self, channel_id: int):
+        while pending := self.pending_acks.get(channel_id):
+            event, _ = next(iter(pending.values()))
+            await event.wait()
+
+    async def drain(self, channel_id: int):
+        q = self.queues[channel_id]
+        try:
+            while q:
+                await self.wait_for_acks(channel_id)
+                _, _, item = heapq.heappop(q)
+                group = [item]
+                if item["merge_key"] is not None:
+                    same = sorted(e for e in q if e[2]["merge_key"] == item["merge_key"])
+                    if same:
+                        q[:] = [e for e in q if e[2]["merge_key"] != item["merge_key"]]
+                        heapq.heapify(q)
+                        group += [e[2] for e in same]
+                        self.merged += len(same)
+                await self.deliver(group, drop_images=len(q) >= OUTBOUND_BACKPRESSURE_DEPTH)
+        finally:
+            self.workers.pop(channel_id, None)
+            if not q:
+                self.queues.pop(channel_id, None)
+
+    async def deliver(self, group: list, drop_images: bool):
+        channel = group[0]["channel"]
+        if len(group) == 1 and not group[0]["image"]:
+            content, embed = group[0]["content"], group[0]["embed"]
+        else:
+            content, embed = None, merge_embeds(group, drop_images)
+            if drop_images:
+                self.dropped += sum(1 for it in group if it["image"])
+        msg = None
+        try:
+            msg = await channel.send(content=content, embed=embed)
+            self.sent += 1
+        except (discord.HTTPException, discord.RateLimited) as e:
+            # 429s were already counted from discord.py's log by RateLimitCounter
+            print(f"Outbound send to {channel.id} failed: {e}")
+        for it in group:
+            if not it["future"].done():
+                it["future"].set_result(msg)
+
+def merge_embeds(group: list, drop_images: bool) -> discord.Embed:
+    parts = []
+    title, color, image = None, None, None
+    for it in group:
+        if it["content"]:
+            parts.append(it["content"])
+        if it["embed"] is not None:
+            title = title or it["embed"].title
+            color = color or it["embed"].color
+            if it["embed"].description:
+                parts.append(it["embed"].description)
+        image = image or it["image"]
+    embed = discord.Embed(title=title, description="\n\n".join(parts), color=color)
+    if image and not drop_images:
+        embed.set_image(url=image)
+    return embed
+
+class RateLimitCounter(logging.Handler):
+    # discord.py retries 429s itself and only logs them; count them from its log records.
+    # Every 429 response logs exactly one warning starting with this format string (the
+    # "Global rate limit has been hit" warning that can follow is the same response).
+    PREFIX = "We are being rate limited."
+
+    def emit(self, record: logging.LogRecord):
+        if isinstance(record.msg, str) and record.msg.startswith(self.PREFIX):
+            outbound.rate_limited += 1
+
+outbound = Outbound()
+logging.getLogger("discord.http").addHandler(RateLimitCounter(logging.WARNING))
+
+class OutboundView(discord.ui.View):
+    # Base for the bot's views. discord.py only calls interaction_check for clicks on a view that
+    # is still listening, right before the item callback in the same task, so clicks on expired
+    # boards and menus never hold back a channel's queue.
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        outbound.track_interaction(interaction)
+        return True
+
+def send_win_gif(channel: discord.TextChannel, note: str = "You won!", merge_key=None) -> asyncio.Future:
+    # the result goes out at full priority; the GIF rides along as a cosmetic merged into it
+    merge_key = merge_key if merge_key is not None else object()
     embed = discord.Embed(title="🏎️ BIG WIN!", description=note, color=discord.Color.gold())
-    embed.set_image(url=LAMBO_GIF)
-    await channel.send(embed=embed)
+    fut = outbound.send(channel, embed=embed, merge_key=merge_key)
+    outbound.send(channel, image=LAMBO_GIF, merge_key=merge_key, priority=PRIORITY_COSMETIC)
+    return fut
 
 # -------------------------
 # VIEWS / INTERACTIONS
@@ -153,13 +670,11 @@ class EconomySetupModal(discord.ui.Modal, title="Set Up Server Economy"):
         self.guild_id = guild_id
 
     async def on_submit(self, interaction: discord.Interaction):
-        ensure_server_row(self.guild_id)
         name = self.currency_name.value.strip() or DEFAULT_CURRENCY
-        cur.execute("UPDATE servers SET currency_name=? WHERE guild_id=?", (name, self.guild_id))
-        conn.commit()
+        await store.set_currency(self.guild_id, name)
         await interaction.response.send_message(f"✅ Server currency set to **{name}**.", ephemeral=True)
 
-class GamesMenu(discord.ui.View):
+class GamesMenu(OutboundView):
     def __init__(self, author_id: int):
         super().__init__(timeout=60)
         self.author_id = author_id
@@ -185,27 +700,125 @@ class GamesMenu(discord.ui.View):
 # -------------------------
 # GAMES STATE (in-memory)
 # -------------------------
-dice_sessions = {}  # channel_id -> session dict
+dice_sessions = {}  # channel_id -> lobby UI state for dice games this process is running; bets live in store
 gamble_cooldowns = {}  # (guild_id,user_id) -> datetime
 
+def claim_gamble_cooldown(key, cooldown: int):
+    # checked and set with no await in between, so a second command can't slip in; returns the
+    # previous claim time (None if there wasn't one) for release_gamble_cooldown, or False if too soon
+    now = datetime.utcnow()
+    last = gamble_cooldowns.get(key)
+    if last is not None and (now - last).total_seconds() < cooldown:
+        return False
+    gamble_cooldowns[key] = now
+    return last
+
+def release_gamble_cooldown(key, last):
+    # the bet was refused; an empty wallet shouldn't cost a cooldown
+    if last is None:
+        gamble_cooldowns.pop(key, None)
+    else:
+        gamble_cooldowns[key] = last
+dice_lobby_results = {"played": 0, "refunded": 0}  # per-channel lobbies, to compare with matchmaking
+
 # -------------------------
 # BOT EVENTS
 # -------------------------
-@bot.event
-async def on_ready():
-    print(f"Bloop is online as {bot.user}")
+async def command_tree_hash() -> str:
+    # Hash of the exact payload tree.sync() would upload (choices, limits, permissions and
+    # localizations included), so any change that Discord would see triggers a re-sync.
+    translator = tree.translator
+    if translator:
+        payload = [await cmd.get_translated_payload(tree, translator) for cmd in tree.get_commands()]
+    else:
+        payload = [cmd.to_dict(tree) for cmd in tree.get_commands()]
+    payload.sort(key=lambda c: (c.get("type", 1), c["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+async def sync_commands_if_changed():
+    # tree.sync() is a rate-limited bulk overwrite; skip it when the signatures haven't changed.
+    key = f"command_tree_hash:{bot.application_id}"
+    digest = await command_tree_hash()
+    if await store.get_meta(key) == digest and not os.getenv("BLOOP_FORCE_SYNC"):
+        print("/ commands unchanged, skipping sync")
+        return
     try:
         synced = await tree.sync()
+        await store.set_meta(key, digest)
         print(f"/ commands synced: {len(synced)}")
     except Exception as e:
         print("Slash sync failed:", e)
 
+@tasks.loop(minutes=1)
+async def refund_stale_sessions():
+    # a lobby that outlived its join window by this much was cut off by a restart/crash
+    # (possibly of another shard); give the escrowed bets back
+    # errors are caught per channel: an exception escaping a tasks.loop body stops the loop for good
+    cutoff = datetime.utcnow() - timedelta(seconds=JOIN_WINDOW_MAX_SECONDS + SESSION_ORPHAN_GRACE_SECONDS)
+    try:
+        stale = await store.stale_sessions(cutoff)
+    except Exception as e:
+        print(f"Stale session scan failed: {e}")
+        return
+    for ch_id in stale:
+        if ch_id in dice_sessions:
+            continue
+        try:
+            closed = await store.close_session(ch_id)
+            if closed:
+                guild_id, bets = closed
+                for uid, bet in bets.items():
+                    await add_balance(guild_id, uid, bet)
+                print(f"Refunded {len(bets)} bet(s) from interrupted session in channel {ch_id}")
+        except Exception as e:
+            print(f"Refunding interrupted session in channel {ch_id} failed: {e}")
+
+@tasks.loop(seconds=CONFIG_POLL_SECONDS)
+async def refresh_guild_configs():
+    # an exception escaping a tasks.loop body stops the loop for good; log it and poll again next tick
+    try:
+        await guild_configs.poll()
+    except Exception as e:
+        print(f"Guild config poll failed: {e}")
+
+@tasks.loop(minutes=STATS_COMPACT_MINUTES)
+async def compact_economy_stats():
+    # persist flow deltas and re-check seeded aggregates against the users table; a write made
+    # outside the wrappers (imports, manual SQL) or a race on Postgres is corrected here.
+    # A failing guild is logged and retried next run (flush_flows keeps its deltas).
+    async with stats_lock:
+        for guild_id, g in list(economy_stats.guilds.items()):
+            try:
+                await flush_flows(guild_id, g)
+                if g.seeded and g.rebuild(await store.nonzero_balances(guild_id)):
+                    economy_stats.corrections += 1
+                    print(f"Economy stats for guild {guild_id} had drifted; rebuilt from the DB")
+            except Exception as e:
+                print(f"Economy stats compaction for guild {guild_id} failed: {e}")
+
+async def setup_hook():
+    # runs once per process after login; on_ready fires again on every reconnect
+    refund_stale_sessions.start()
+    refresh_guild_configs.start()
+    compact_economy_stats.start()
+    await sync_commands_if_changed()
+
+bot.setup_hook = setup_hook
+
+@bot.event
+async def on_ready():
+    print(f"Bloop is online as {bot.user}")
+
+@bot.event
+async def on_raw_member_remove(payload: discord.RawMemberRemoveEvent):
+    member_names.forget(payload.guild_id, payload.user.id)
+
 # -------------------------
 # HELP
 # -------------------------
 @bot.command(name="bloophelp")
 async def bloophelp(ctx: commands.Context):
-    currency = get_currency(ctx.guild.id)
+    currency = await get_currency(ctx.guild.id)
     embed = discord.Embed(title="🐙 Bloop Help", color=discord.Color.blurple())
     embed.description = (
         f"**💰 Economy**\n"
@@ -213,14 +826,20 @@ async def bloophelp(ctx: commands.Context):
         f"`{COMMAND_PREFIX}bloopdaily` – Claim daily {currency}\n"
         f"`{COMMAND_PREFIX}bloopgift @user amount` – Gift coins\n"
         f"`{COMMAND_PREFIX}bloopboard` – Top 10 richest\n"
+        f"`{COMMAND_PREFIX}bloopstats` – Money supply, inequality and where coins come from\n"
         f"`{COMMAND_PREFIX}economy` – Setup server economy (admin)\n"
+        f"`{COMMAND_PREFIX}bloopconfig [setting value]` – Tune daily/games for this server (admin)\n"
         f"`{COMMAND_PREFIX}trade <target_server_id> <amount>` – Server → server transfer (admin)\n"
-        f"`{COMMAND_PREFIX}borrow @user <amount>` – Ask user for a loan\n\n"
+        f"`{COMMAND_PREFIX}bloopexport` / `{COMMAND_PREFIX}bloopimport [replace]` – Backup/restore economy (admin)\n"
+        f"`{COMMAND_PREFIX}borrow @user <amount>` – Ask user for a loan\n"
+        f"`{COMMAND_PREFIX}repay [@lender]` – Pay back your oldest loan\n"
+        f"`{COMMAND_PREFIX}bloopbadges [@user]` – Achievements\n\n"
         f"**🎮 Games**\n"
         f"`{COMMAND_PREFIX}bloopgames` – Pick a game\n"
         f"`{COMMAND_PREFIX}bloopplay random` – Random money 💸\n"
         f"`{COMMAND_PREFIX}bloopplay dice <bet>` – Multiplayer dice 🎲\n"
-        f"`{COMMAND_PREFIX}bloopplay ttt @opponent` – Tic Tac Toe ❌⭕\n"
+        f"`{COMMAND_PREFIX}bloopplay ttt [@opponent]` – Tic Tac Toe ❌⭕ (no mention: find an opponent)\n"
+        f"`{COMMAND_PREFIX}bloopqueue ttt` / `{COMMAND_PREFIX}bloopqueue dice <bet>` – Match with anyone in the server\n"
         f"`{COMMAND_PREFIX}bloopplay coin <bet> <heads/tails>` – Coin toss 🪙\n"
         f"`{COMMAND_PREFIX}bloopplay wheel <bet>` – Spinning wheel 🎡\n"
         f"`{COMMAND_PREFIX}bloopplay blackjack <bet>` – Blackjack ♠️♣️♥️♦️\n\n"
@@ -248,25 +867,24 @@ async def pong(ctx):
 @bot.command(name="bloopbank")
 async def bloopbank(ctx, member: discord.Member = None):
     member = member or ctx.author
-    bal = get_balance(ctx.guild.id, member.id)
-    currency = get_currency(ctx.guild.id)
+    bal = await get_balance(ctx.guild.id, member.id)
+    currency = await get_currency(ctx.guild.id)
     embed = discord.Embed(title="🏦 Bloop Bank", color=discord.Color.green())
     embed.add_field(name=str(member), value=f"Balance: **{fmt(bal, currency)}**", inline=False)
     await ctx.send(embed=embed)
 
 @bot.command(name="bloopdaily")
 async def bloopdaily(ctx):
-    ensure_user_row(ctx.guild.id, ctx.author.id)
     # cooldown: 24h
-    ok, rem = check_cooldown(ctx.guild.id, ctx.author.id, "daily")
+    ok, rem = await claim_cooldown(ctx.guild.id, ctx.author.id, "daily", 24*3600)
     if not ok:
         hours = rem // 3600
         mins = (rem % 3600) // 60
         return await ctx.send(f"⏳ You can claim again in **{hours}h {mins}m**.")
-    add_balance(ctx.guild.id, ctx.author.id, DAILY_AMOUNT)
-    set_cooldown(ctx.guild.id, ctx.author.id, "daily", 24*3600)
-    currency = get_currency(ctx.guild.id)
-    await ctx.send(f"🎁 You claimed **{fmt(DAILY_AMOUNT, currency)}**!")
+    amount = (await guild_configs.get(ctx.guild.id)).daily_amount
+    await add_balance(ctx.guild.id, ctx.author.id, amount, source="daily")
+    currency = await get_currency(ctx.guild.id)
+    await ctx.send(f"🎁 You claimed **{fmt(amount, currency)}**!")
 
 @bot.command(name="bloopgift")
 async def bloopgift(ctx, member: discord.Member = None, amount: int = None):
@@ -275,29 +893,46 @@ async def bloopgift(ctx, member: discord.Member = None, amount: int = None):
     if member.bot:
         return await ctx.send("You can’t gift bots.")
     guild_id = ctx.guild.id
-    sender_bal = get_balance(guild_id, ctx.author.id)
-    if sender_bal < amount:
+    if not await transfer(guild_id, ctx.author.id, member.id, amount):
         return await ctx.send("❌ Not enough balance.")
-    add_balance(guild_id, ctx.author.id, -amount)
-    add_balance(guild_id, member.id, amount)
-    currency = get_currency(guild_id)
+    currency = await get_currency(guild_id)
     await ctx.send(f"🔄 {ctx.author.mention} sent **{fmt(amount, currency)}** to {member.mention}!")
 
 @bot.command(name="bloopboard")
 async def bloopboard(ctx):
-    currency = get_currency(ctx.guild.id)
-    cur.execute("SELECT user_id, balance FROM users WHERE guild_id=? ORDER BY balance DESC LIMIT 10", (ctx.guild.id,))
-    rows = cur.fetchall()
+    currency = await get_currency(ctx.guild.id)
+    rows = await store.top_balances(ctx.guild.id, BOARD_SIZE)
     if not rows:
         return await ctx.send("No data yet.")
+    badges.board_read(ctx.guild.id, rows)
+    names = await member_names.resolve(ctx.guild, [uid for uid, _ in rows])
     desc = []
     for i, (uid, bal) in enumerate(rows, start=1):
-        user = ctx.guild.get_member(uid) or f"<@{uid}>"
-        name = user.display_name if isinstance(user, discord.Member) else str(user)
+        name = names[uid]
         desc.append(f"**{i}.** {name} — {fmt(int(bal), currency)}")
     embed = discord.Embed(title=f"🏆 Richest in {ctx.guild.name}", description="\n".join(desc), color=discord.Color.gold())
     await ctx.send(embed=embed)
 
+STATS_SOURCES = {"daily": "🎁 Daily", "games": "🎮 Games", "gifts": "🔄 Gifts", "loans": "💸 Loans"}
+
+@bot.command(name="bloopstats")
+async def bloopstats(ctx):
+    currency = await get_currency(ctx.guild.id)
+    g = await guild_stats(ctx.guild.id)
+    embed = discord.Embed(title=f"📊 Economy of {ctx.guild.name}", color=discord.Color.teal())
+    embed.add_field(name="Money supply", value=fmt(g.supply, currency))
+    embed.add_field(name="Holders", value=f"{g.holders:,}")
+    embed.add_field(name="Gini (≈)", value=f"{g.gini():.2f}")
+    embed.add_field(name="Balances (≈)", value=" · ".join(f"p{p}: {g.percentile(p):,}" for p in (25, 50, 90, 99)),
+                    inline=False)
+    flows = []
+    for source, label in STATS_SOURCES.items():
+        credited, debited = g.flows.get(source, (0, 0))
+        if credited or debited:
+            flows.append(f"{label}: {credited - debited:+,} (in {credited:,} / out {debited:,})")
+    embed.add_field(name="Net flow by source", value="\n".join(flows) or "Nothing yet.", inline=False)
+    await ctx.send(embed=embed)
+
 # -------------------------
 # SERVER ECONOMY SETUP + ADMIN
 # -------------------------
@@ -305,10 +940,8 @@ async def bloopboard(ctx):
 async def economy(ctx, *, currency_name: str = None):
     if not is_adminish(ctx.author):
         return await ctx.send("Only server owner/managers/admins can use this.")
-    ensure_server_row(ctx.guild.id)
     if currency_name:
-        cur.execute("UPDATE servers SET currency_name=? WHERE guild_id=?", (currency_name[:24], ctx.guild.id))
-        conn.commit()
+        await store.set_currency(ctx.guild.id, currency_name[:24])
         return await ctx.send(f"✅ Server currency set to **{currency_name[:24]}**.")
     # interactive modal
     try:
@@ -317,6 +950,33 @@ async def economy(ctx, *, currency_name: str = None):
     except Exception:
         await ctx.send("Your discord.py might be older. Provide a currency name: `!economy My Coins`")
 
+@bot.command(name="bloopconfig")
+async def bloopconfig(ctx, key: str = None, *, value: str = None):
+    if not is_adminish(ctx.author):
+        return await ctx.send("Only server owner/managers/admins can use this.")
+    guild_id = ctx.guild.id
+    cfg = await guild_configs.get(guild_id)
+    if key is not None:
+        key = key.lower()
+        if key != "wheel" and key not in CONFIG_LIMITS:
+            return await ctx.send(f"❌ Unknown setting. Try one of: {', '.join(f'`{k}`' for k in default_settings())}")
+        if value is None:
+            return await ctx.send(f"Usage: `{COMMAND_PREFIX}bloopconfig {key} <value|default>`"
+                                  + (" (wheel: `0:20,0.5:30,1:25,2:15,5:8,10:2` as multiplier:weight)" if key == "wheel" else ""))
+        try:
+            new = None if value.lower() == "default" else parse_setting(key, value)
+        except ValueError as e:
+            return await ctx.send(f"❌ Bad value for `{key}`: {e}")
+        cfg = await guild_configs.update(guild_id, {key: new})
+    embed = discord.Embed(title="⚙️ Bloop Config", color=discord.Color.blurple())
+    for name, default in default_settings().items():
+        current = cfg.overrides.get(name, default)
+        shown = ", ".join(f"x{m}:{w:g}" for m, w in current) if name == "wheel" else f"{current:,}"
+        embed.add_field(name=name + (" ✏️" if name in cfg.overrides else ""), value=shown, inline=name != "wheel")
+    embed.set_footer(text=f"version {cfg.version} · ✏️ = changed from default · "
+                          f"{COMMAND_PREFIX}bloopconfig <setting> <value|default>")
+    await ctx.send(embed=embed)
+
 @bot.command(name="trade")
 async def server_trade(ctx, target_guild_id: int = None, amount: int = None):
     if not is_adminish(ctx.author):
@@ -324,16 +984,9 @@ async def server_trade(ctx, target_guild_id: int = None, amount: int = None):
     if not target_guild_id or not amount or amount <= 0:
         return await ctx.send(f"Usage: `{COMMAND_PREFIX}trade <target_server_id> <amount>`")
     # For prototype, subtract from THIS server treasury and add to target treasury.
-    ensure_server_row(ctx.guild.id)
-    ensure_server_row(target_guild_id)
     # make sure this server has enough treasury (or allow negative? your spec allows loans elsewhere)
-    cur.execute("SELECT treasury FROM servers WHERE guild_id=?", (ctx.guild.id,))
-    src_treas = cur.fetchone()[0] or 0
-    if src_treas < amount:
+    if not await store.transfer_treasury(ctx.guild.id, target_guild_id, amount):
         return await ctx.send("❌ Not enough funds in this server treasury.")
-    cur.execute("UPDATE servers SET treasury=treasury-? WHERE guild_id=?", (amount, ctx.guild.id))
-    cur.execute("UPDATE servers SET treasury=treasury+? WHERE guild_id=?", (amount, target_guild_id))
-    conn.commit()
     await ctx.send(f"🏦 Transferred **{amount:,}** treasury units to server `{target_guild_id}`.")
 
 @bot.command(name="borrow")
@@ -341,29 +994,21 @@ async def borrow(ctx, member: discord.Member = None, amount: int = None):
     if member is None or amount is None or amount <= 0:
         return await ctx.send(f"Usage: `{COMMAND_PREFIX}borrow @user <amount>`")
     guild_id = ctx.guild.id
-    cur.execute("INSERT INTO loans(guild_id, lender_id, borrower_id, amount, status, created_at) VALUES(?,?,?,?,?,?)",
-                (guild_id, member.id, ctx.author.id, amount, "pending", datetime.utcnow().isoformat()))
-    loan_id = cur.lastrowid
-    conn.commit()
+    loan_id = await store.create_loan(guild_id, member.id, ctx.author.id, amount)
 
-    view = discord.ui.View()
+    view = OutboundView()
     async def accept(interaction: discord.Interaction):
         if interaction.user.id != member.id:
             return await interaction.response.send_message("Only the lender can accept.", ephemeral=True)
-        # check lender balance
-        if get_balance(guild_id, member.id) < amount:
+        # moves the money only if the loan is still pending and the lender can cover it
+        if not await accept_loan(loan_id, guild_id, amount):
             return await interaction.response.send_message("❌ Not enough balance to loan.", ephemeral=True)
-        add_balance(guild_id, member.id, -amount)
-        add_balance(guild_id, ctx.author.id, amount)
-        cur.execute("UPDATE loans SET status='accepted' WHERE id=?", (loan_id,))
-        conn.commit()
         await interaction.response.edit_message(content=f"✅ Loan accepted. {member.mention} → {ctx.author.mention}: {amount:,}", view=None)
 
     async def reject(interaction: discord.Interaction):
         if interaction.user.id != member.id:
             return await interaction.response.send_message("Only the lender can reject.", ephemeral=True)
-        cur.execute("UPDATE loans SET status='rejected' WHERE id=?", (loan_id,))
-        conn.commit()
+        await store.reject_loan(loan_id)
         await interaction.response.edit_message(content=f"❌ Loan rejected by {member.mention}.", view=None)
 
     view.add_item(discord.ui.Button(label="Accept", style=discord.ButtonStyle.success))
@@ -372,9 +1017,114 @@ async def borrow(ctx, member: discord.Member = None, amount: int = None):
     view.children[0].callback = accept
     view.children[1].callback = reject
 
-    currency = get_currency(guild_id)
+    currency = await get_currency(guild_id)
     await ctx.send(f"💸 {member.mention}, {ctx.author.mention} requests a loan of **{fmt(amount, currency)}**.", view=view)
 
+@bot.command(name="repay")
+async def repay(ctx, lender: discord.Member = None):
+    repaid = await repay_loan(ctx.guild.id, ctx.author.id, lender.id if lender else None)
+    if repaid is None:
+        return await ctx.send("❌ No accepted loan to repay, or not enough balance to cover it.")
+    _, lender_id, amount, _, _ = repaid
+    currency = await get_currency(ctx.guild.id)
+    await ctx.send(f"🤝 {ctx.author.mention} repaid **{fmt(amount, currency)}** to <@{lender_id}>.")
+
+@bot.command(name="bloopbadges")
+async def bloopbadges(ctx, member: discord.Member = None):
+    member = member or ctx.author
+    bits = await store.get_badges(ctx.guild.id, member.id)
+    earned = badges.describe(bits)
+    queued = badges.describe(badges.pending.get((ctx.guild.id, member.id), 0) & ~bits)
+    lines = earned + [f"{line} *(saved with your next balance change)*" for line in queued]
+    embed = discord.Embed(title=f"🏅 Badges — {member.display_name}", color=discord.Color.gold(),
+                          description="\n".join(lines) or "No badges yet.")
+    await ctx.send(embed=embed)
+
+# -------------------------
+# EXPORT / IMPORT / SNAPSHOT
+# -------------------------
+SNAPSHOT_DIR = os.environ.get("BLOOP_SNAPSHOT_DIR", "snapshots")
+
+def on_own_connection(fn, *args, **kwargs):
+    # bulk jobs run in a worker thread on a separate connection. Exports only read (WAL never blocks
+    # the bot on them); imports write in short transactions (per chunk, or one set-based swap for
+    # replace), and a bot write landing meanwhile waits in sqlite3's busy handler, blocking the loop
+    # for that long
+    c = sqlite3.connect(store.path, timeout=30)
+    try:
+        return fn(c, *args, **kwargs)
+    finally:
+        c.close()
+
+def rows_summary(counts: dict, elapsed: float) -> str:
+    total = sum(counts.values())
+    return f"{total:,} rows in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)"
+
+@bot.command(name="bloopexport")
+async def bloopexport(ctx):
+    if not is_adminish(ctx.author):
+        return await ctx.send("Only server owner/managers/admins can use this.")
+    if not isinstance(store, SQLiteStorage):
+        return await ctx.send("❌ Export/import works on the SQLite backend only; use pg_dump for Postgres.")
+    guild_id = ctx.guild.id
+
+    def work():
+        fp = io.StringIO()
+        counts = on_own_connection(economy_io.export_guild, guild_id, fp)
+        return gzip.compress(fp.getvalue().encode("utf-8")), counts
+
+    t0 = time.perf_counter()
+    data, counts = await asyncio.to_thread(work)
+    elapsed = time.perf_counter() - t0
+    if len(data) > ctx.guild.filesize_limit:
+        return await ctx.send(f"❌ Export is {len(data):,} bytes, over this server's upload limit. "
+                              f"Use `python economy_io.py export --guild {guild_id}` on the host instead.")
+    await ctx.send(f"📦 Exported {rows_summary(counts, elapsed)}.",
+                   file=discord.File(io.BytesIO(data), filename=f"bloop-{guild_id}.ndjson.gz"))
+
+@bot.command(name="bloopimport")
+async def bloopimport(ctx, mode: str = None):
+    if not is_adminish(ctx.author):
+        return await ctx.send("Only server owner/managers/admins can use this.")
+    if not isinstance(store, SQLiteStorage):
+        return await ctx.send("❌ Export/import works on the SQLite backend only; use pg_dump for Postgres.")
+    if not ctx.message.attachments:
+        return await ctx.send(f"Usage: attach a `.ndjson(.gz)` export to `{COMMAND_PREFIX}bloopimport [replace]`")
+    data = await ctx.message.attachments[0].read()
+    replace = (mode or "").lower() == "replace"
+    guild_id = ctx.guild.id  # always import into the invoking guild
+
+    def work():
+        # treasury/debt stay out: an admin could otherwise mint treasury and !trade it away
+        return on_own_connection(economy_io.import_guild, economy_io.text_stream(data), guild_id,
+                                 replace=replace, commit_every_chunk=True,
+                                 check_settings=lambda text: clean_overrides(json.loads(text)))
+
+    t0 = time.perf_counter()
+    try:
+        counts = await asyncio.to_thread(work)
+    except (ValueError, KeyError, IndexError, UnicodeDecodeError, OSError) as e:
+        return await ctx.send(f"❌ Import failed: {e}")
+    http_cache.clear()
+    guild_configs.forget(guild_id)
+    economy_stats.forget(guild_id)
+    badges.forget(guild_id)
+    await ctx.send(f"📥 Imported {rows_summary(counts, time.perf_counter() - t0)}"
+                   f"{' (replaced existing data)' if replace else ''}.")
+
+@bot.command(name="bloopsnapshot")
+async def bloopsnapshot(ctx):
+    # whole-database copy, so bot owner only
+    if not await bot.is_owner(ctx.author):
+        return await ctx.send("Only the bot owner can use this.")
+    if not isinstance(store, SQLiteStorage):
+        return await ctx.send("❌ Snapshots work on the SQLite backend only; use pg_dump for Postgres.")
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    dest = os.path.join(SNAPSHOT_DIR, f"bloop-{datetime.utcnow():%Y%m%d-%H%M%S}.sqlite3")
+    t0 = time.perf_counter()
+    pages = await asyncio.to_thread(economy_io.snapshot_db, store.path, dest)
+    await ctx.send(f"🗄️ Snapshot written to `{dest}` ({pages:,} pages in {time.perf_counter() - t0:.2f}s).")
+
 # -------------------------
 # BLOOP GAMES MENU
 # -------------------------
@@ -392,13 +1142,12 @@ async def bloopplay(ctx, game: str = None, *args):
 
     if game == "random":
         # simple RNG earn with cooldown
-        ok, rem = check_cooldown(ctx.guild.id, ctx.author.id, "random_money")
+        ok, rem = await claim_cooldown(ctx.guild.id, ctx.author.id, "random_money", RANDOM_MONEY_COOLDOWN_MIN*60)
         if not ok:
             return await ctx.send(f"⏳ Try again in {rem}s.")
-        amount = random.randint(0, RANDOM_MONEY_MAX)
-        add_balance(ctx.guild.id, ctx.author.id, amount)
-        set_cooldown(ctx.guild.id, ctx.author.id, "random_money", RANDOM_MONEY_COOLDOWN_MIN*60)
-        currency = get_currency(ctx.guild.id)
+        amount = random.randint(0, (await guild_configs.get(ctx.guild.id)).random_money_max)
+        await add_balance(ctx.guild.id, ctx.author.id, amount)
+        currency = await get_currency(ctx.guild.id)
         return await ctx.send(f"🎁 You found **{fmt(amount, currency)}** on the ground.")
 
     elif game == "dice":
@@ -408,42 +1157,53 @@ async def bloopplay(ctx, game: str = None, *args):
         bet = int(args[0])
         if bet <= 0:
             return await ctx.send("Bet must be positive.")
-        bal = get_balance(ctx.guild.id, ctx.author.id)
-        if bal < bet:
-            return await ctx.send("❌ Not enough balance for that bet.")
+        window = (await guild_configs.get(ctx.guild.id)).join_window_seconds
         ch_id = ctx.channel.id
         if ch_id in dice_sessions:
             return await ctx.send("A dice game is already running in this channel. Please wait.")
 
-        # create session
+        # create session (claim the channel locally before the first await)
         dice_sessions[ch_id] = {
             "guild_id": ctx.guild.id,
-            "bets": {ctx.author.id: bet},
+            "players": {ctx.author.id},
             "message_id": None,
             "started_at": datetime.utcnow()
         }
-        add_balance(ctx.guild.id, ctx.author.id, -bet)
-        currency = get_currency(ctx.guild.id)
+        if not await try_debit(ctx.guild.id, ctx.author.id, bet):
+            dice_sessions.pop(ch_id, None)
+            return await ctx.send("❌ Not enough balance for that bet.")
+        # bets are escrowed in the store so a restart mid-game refunds them
+        if not await store.open_session(ch_id, ctx.guild.id, "dice", ctx.author.id, bet):
+            dice_sessions.pop(ch_id, None)
+            await add_balance(ctx.guild.id, ctx.author.id, bet)
+            return await ctx.send("A dice game is already running in this channel. Please wait.")
+        currency = await get_currency(ctx.guild.id)
 
-        view = discord.ui.View(timeout=JOIN_WINDOW_SECONDS)
+        view = OutboundView(timeout=window)
 
         async def join(interaction: discord.Interaction):
             if interaction.channel_id != ch_id:
-                return
+                return await interaction.response.defer()
             uid = interaction.user.id
-            if uid in dice_sessions[ch_id]["bets"]:
+            sess = dice_sessions.get(ch_id)
+            if sess is None:
+                return await interaction.response.send_message("This dice game has already ended.", ephemeral=True)
+            if uid in sess["players"]:
                 return await interaction.response.send_message("You already joined.", ephemeral=True)
             # ask for same bet as starter?
             # Let each choose their own bet (deduct now)
-            user_bal = get_balance(ctx.guild.id, uid)
-            if user_bal < bet:
+            sess["players"].add(uid)
+            if not await try_debit(ctx.guild.id, uid, bet):
+                sess["players"].discard(uid)
                 return await interaction.response.send_message("Not enough balance for the entry bet.", ephemeral=True)
-            add_balance(ctx.guild.id, uid, -bet)
-            dice_sessions[ch_id]["bets"][uid] = bet
+            if not await store.join_session(ch_id, uid, bet):
+                sess["players"].discard(uid)
+                await add_balance(ctx.guild.id, uid, bet)
+                return await interaction.response.send_message("This dice game has already ended.", ephemeral=True)
             await interaction.response.edit_message(content=f"🎲 **Bloop Dice** started by {ctx.author.mention}\n"
-                                                           f"Players joined: {len(dice_sessions[ch_id]['bets'])}\n"
+                                                           f"Players joined: {len(sess['players'])}\n"
                                                            f"Entry bet: **{fmt(bet, currency)}**\n"
-                                                           f"Join window: {JOIN_WINDOW_SECONDS}s", view=view)
+                                                           f"Join window: {window}s", view=view)
 
         join_btn = discord.ui.Button(label="Join Dice", style=discord.ButtonStyle.primary, emoji="🎲")
         join_btn.callback = join
@@ -452,32 +1212,41 @@ async def bloopplay(ctx, game: str = None, *args):
         msg = await ctx.send(f"🎲 **Bloop Dice** started by {ctx.author.mention}\n"
                              f"Players joined: 1\n"
                              f"Entry bet: **{fmt(bet, currency)}**\n"
-                             f"Join window: {JOIN_WINDOW_SECONDS}s", view=view)
+                             f"Join window: {window}s", view=view)
         dice_sessions[ch_id]["message_id"] = msg.id
 
-        await asyncio.sleep(JOIN_WINDOW_SECONDS)
+        await asyncio.sleep(window)
         # evaluate
-        sess = dice_sessions.pop(ch_id, None)
-        if not sess:
+        dice_sessions.pop(ch_id, None)
+        closed = await store.close_session(ch_id)
+        if not closed:
             return
-        players = list(sess["bets"].keys())
+        bets = closed[1]
+        players = list(bets.keys())
         if len(players) < 2:
             # refund starter
-            add_balance(ctx.guild.id, players[0], bet)
+            for uid, b in bets.items():
+                await add_balance(ctx.guild.id, uid, b)
+            dice_lobby_results["refunded"] += 1
             return await ctx.send("Not enough players joined. Bet refunded.")
+        dice_lobby_results["played"] += 1
         rolls = {uid: random.randint(1, 6) for uid in players}
         high = max(rolls.values())
         winners = [u for u, r in rolls.items() if r == high]
-        pot = sum(sess["bets"].values())
+        for uid in players:
+            badges.game_result(ctx.guild.id, uid, uid in winners)
+        pot = sum(bets.values())
         prize_each = pot // len(winners)
         for w in winners:
-            add_balance(ctx.guild.id, w, prize_each)
+            await add_balance(ctx.guild.id, w, prize_each)
         lines = [f"<@{uid}> rolled **{r}**" for uid, r in rolls.items()]
-        await ctx.send("🎲 Rolls:\n" + "\n".join(lines))
+        # rolls + winner (+ GIF) go out as one message
+        key = ("dice", ch_id, msg.id)
+        outbound.send(ctx.channel, "🎲 Rolls:\n" + "\n".join(lines), merge_key=key)
         if len(winners) == 1:
-            await send_win_gif(ctx.channel, note=f"<@{winners[0]}> won the pot: **{fmt(pot, currency)}**!")
+            send_win_gif(ctx.channel, note=f"<@{winners[0]}> won the pot: **{fmt(pot, currency)}**!", merge_key=key)
         else:
-            await ctx.send(f"🤝 Tie! Winners split pot **{fmt(pot, currency)}** → {', '.join(f'<@{w}>' for w in winners)}")
+            outbound.send(ctx.channel, merge_key=key, content=f"🤝 Tie! Winners split pot **{fmt(pot, currency)}** → {', '.join(f'<@{w}>' for w in winners)}")
 
     elif game == "coin":
         # coin toss bet heads/tails
@@ -492,24 +1261,24 @@ async def bloopplay(ctx, game: str = None, *args):
             return await ctx.send("Pick heads or tails.")
         if bet <= 0:
             return await ctx.send("Bet must be positive.")
-        bal = get_balance(ctx.guild.id, ctx.author.id)
-        if bal < bet:
-            return await ctx.send("❌ Not enough balance.")
         # cooldown per user
+        cooldown = (await guild_configs.get(ctx.guild.id)).gamble_cooldown_seconds
         key = (ctx.guild.id, ctx.author.id)
-        now = datetime.utcnow()
-        if key in gamble_cooldowns and (now - gamble_cooldowns[key]).total_seconds() < GAMBLE_COOLDOWN_SECONDS:
+        last = claim_gamble_cooldown(key, cooldown)
+        if last is False:
             return await ctx.send("⏳ Slow down a bit!")
-        gamble_cooldowns[key] = now
+        if not await try_debit(ctx.guild.id, ctx.author.id, bet):
+            release_gamble_cooldown(key, last)
+            return await ctx.send("❌ Not enough balance.")
 
-        add_balance(ctx.guild.id, ctx.author.id, -bet)
         result = random.choice(["heads", "tails"])
-        currency = get_currency(ctx.guild.id)
+        currency = await get_currency(ctx.guild.id)
+        badges.game_result(ctx.guild.id, ctx.author.id, result == pick)
         if result == pick:
-            add_balance(ctx.guild.id, ctx.author.id, bet * 2)
-            await send_win_gif(ctx.channel, note=f"You won **{fmt(bet*2, currency)}** (coin was **{result}**)!")
+            await add_balance(ctx.guild.id, ctx.author.id, bet * 2)
+            send_win_gif(ctx.channel, note=f"You won **{fmt(bet*2, currency)}** (coin was **{result}**)!")
         else:
-            await ctx.send(f"😬 Lost. It was **{result}**.")
+            outbound.send(ctx.channel, f"😬 Lost. It was **{result}**.")
 
     elif game == "wheel":
         # spinning wheel: random multiplier
@@ -521,43 +1290,27 @@ async def bloopplay(ctx, game: str = None, *args):
             return await ctx.send("Bet must be a number.")
         if bet <= 0:
             return await ctx.send("Bet must be positive.")
-        bal = get_balance(ctx.guild.id, ctx.author.id)
-        if bal < bet:
+        if not await try_debit(ctx.guild.id, ctx.author.id, bet):
             return await ctx.send("❌ Not enough balance.")
-        add_balance(ctx.guild.id, ctx.author.id, -bet)
-        # multipliers with rough probabilities
-        wheel = [
-            (0, 0.20),
-            (0.5, 0.30),
-            (1, 0.25),
-            (2, 0.15),
-            (5, 0.08),
-            (10, 0.02),
-        ]
-        r = random.random()
-        acc = 0
-        mult = 0
-        for m, p in wheel:
-            acc += p
-            if r <= acc:
-                mult = m
-                break
+        mult = (await guild_configs.get(ctx.guild.id)).spin(random.random())
         winnings = int(bet * mult)
+        if winnings != bet:
+            badges.game_result(ctx.guild.id, ctx.author.id, winnings > bet)
         if winnings > 0:
-            add_balance(ctx.guild.id, ctx.author.id, winnings)
-            currency = get_currency(ctx.guild.id)
-            await send_win_gif(ctx.channel, note=f"Wheel landed **x{mult}** → You got **{fmt(winnings, currency)}**!")
+            await add_balance(ctx.guild.id, ctx.author.id, winnings)
+            currency = await get_currency(ctx.guild.id)
+            send_win_gif(ctx.channel, note=f"Wheel landed **x{mult}** → You got **{fmt(winnings, currency)}**!")
         else:
-            await ctx.send("💀 Wheel landed on **x0** — better luck next time.")
+            outbound.send(ctx.channel, "💀 Wheel landed on **x0** — better luck next time.")
 
     elif game == "ttt":
-        # Tic Tac Toe vs mentioned user
+        # Tic Tac Toe vs mentioned user, or whoever is next in the guild's queue
         if not args or not ctx.message.mentions:
-            return await ctx.send(f"Usage: `{COMMAND_PREFIX}bloopplay ttt @opponent`")
+            return await join_match_queue(ctx, "ttt", 0)
         opponent = ctx.message.mentions[0]
         if opponent.bot or opponent.id == ctx.author.id:
             return await ctx.send("Pick a real opponent.")
-        await start_ttt(ctx, ctx.author, opponent)
+        await start_ttt(ctx, ctx.author, opponent, reward=(await guild_configs.get(ctx.guild.id)).ttt_reward)
 
     elif game == "blackjack":
         # Blackjack vs dealer
@@ -569,28 +1322,196 @@ async def bloopplay(ctx, game: str = None, *args):
             return await ctx.send("Bet must be a number.")
         if bet <= 0:
             return await ctx.send("Bet must be positive.")
-        bal = get_balance(ctx.guild.id, ctx.author.id)
-        if bal < bet:
-            return await ctx.send("❌ Not enough balance.")
-
         # cooldown per user
+        cooldown = (await guild_configs.get(ctx.guild.id)).gamble_cooldown_seconds
         key = (ctx.guild.id, ctx.author.id)
-        now = datetime.utcnow()
-        if key in gamble_cooldowns and (now - gamble_cooldowns[key]).total_seconds() < GAMBLE_COOLDOWN_SECONDS:
+        last = claim_gamble_cooldown(key, cooldown)
+        if last is False:
             return await ctx.send("⏳ Slow down a bit!")
-        gamble_cooldowns[key] = now
+        if not await try_debit(ctx.guild.id, ctx.author.id, bet):
+            release_gamble_cooldown(key, last)
+            return await ctx.send("❌ Not enough balance.")
 
-        add_balance(ctx.guild.id, ctx.author.id, -bet)
         await start_blackjack(ctx, bet)
 
     else:
         await ctx.send("❌ no game available")
 
+# -------------------------
+# MATCHMAKING
+# -------------------------
+# Guild-wide queues so players don't need to be in the same channel at the same time. One queue
+# per (guild, game, bet bracket), oldest first: pairing is a heap pop and a cancelled or expired
+# entry is skipped when it reaches the top. Nothing is debited while waiting, so a timeout costs
+# no writes; bets are taken when the match starts.
+MATCH_GAMES = ("ttt", "dice")
+MATCH_TIMEOUT_SECONDS = 120
+MATCH_SCAN_LIMIT = 8  # waiting players looked at per join before giving up on a shared channel
+
+def bet_bracket(bet: int) -> int:
+    # 0 (no bet), 1, 2–3, 4–7, 8–15, ...: paired bets are within 2x of each other
+    return bet.bit_length()
+
+def can_play_in(channel, member) -> bool:
+    perms = channel.permissions_for(member)
+    return perms.view_channel and perms.send_messages
+
+class MatchEntry:
+    def __init__(self, guild_id: int, game: str, bet: int, member: discord.Member, channel, seq: int):
+        self.guild_id = guild_id
+        self.game = game
+        self.bet = bet
+        self.member = member
+        self.channel = channel
+        self.seq = seq
+        self.queued_at = time.monotonic()
+        self.cancelled = False
+        self.timer = None
+
+class Matchmaker:
+    def __init__(self):
+        self.queues = {}  # (guild_id, game, bracket) -> heap of (seq, entry)
+        self.by_user = {}  # (guild_id, user_id) -> waiting entry
+        self.seq = itertools.count()
+        self.matches = {g: 0 for g in MATCH_GAMES}
+        self.timeouts = {g: 0 for g in MATCH_GAMES}
+        self.refunds = {g: 0 for g in MATCH_GAMES}  # matches called off after one bet was taken
+        self.wait_sum = {g: 0.0 for g in MATCH_GAMES}
+
+    def waiting(self, guild_id: int, user_id: int):
+        return self.by_user.get((guild_id, user_id))
+
+    def join(self, guild_id: int, game: str, bet: int, member: discord.Member, channel):
+        # (opponent entry, channel both can see) if someone compatible is waiting; otherwise
+        # queues the player and returns (None, None)
+        key = (guild_id, game, bet_bracket(bet))
+        heap = self.queues.setdefault(key, [])
+        skipped = []
+        found = None
+        while heap and len(skipped) < MATCH_SCAN_LIMIT:
+            item = heapq.heappop(heap)
+            other = item[1]
+            if other.cancelled:
+                continue
+            if can_play_in(other.channel, member):
+                found = (other, other.channel)
+            elif can_play_in(channel, other.member):
+                found = (other, channel)
+            if found:
+                break
+            skipped.append(item)
+        for item in skipped:
+            heapq.heappush(heap, item)
+        if found:
+            other = found[0]
+            self.remove(other)
+            self.matches[game] += 1
+            self.wait_sum[game] += time.monotonic() - other.queued_at
+            return found
+        entry = MatchEntry(guild_id, game, bet, member, channel, next(self.seq))
+        heapq.heappush(heap, (entry.seq, entry))
+        self.by_user[(guild_id, member.id)] = entry
+        entry.timer = asyncio.get_running_loop().call_later(MATCH_TIMEOUT_SECONDS, self.expire, entry)
+        return None, None
+
+    def remove(self, entry: MatchEntry):
+        entry.cancelled = True
+        if entry.timer is not None:
+            entry.timer.cancel()
+        if self.by_user.get((entry.guild_id, entry.member.id)) is entry:
+            del self.by_user[(entry.guild_id, entry.member.id)]
+        # drop cancelled entries from the top so an idle queue doesn't hold on to them
+        key = (entry.guild_id, entry.game, bet_bracket(entry.bet))
+        heap = self.queues.get(key)
+        while heap and heap[0][1].cancelled:
+            heapq.heappop(heap)
+        if heap is not None and not heap:
+            del self.queues[key]
+
+    def leave(self, guild_id: int, user_id: int):
+        entry = self.by_user.get((guild_id, user_id))
+        if entry is not None:
+            self.remove(entry)
+        return entry
+
+    def expire(self, entry: MatchEntry):
+        if entry.cancelled:
+            return
+        self.remove(entry)
+        self.timeouts[entry.game] += 1
+        outbound.send(entry.channel, f"⌛ {entry.member.mention} no {entry.game} opponent turned up; "
+                                     f"you've left the queue (nothing was charged).")
+
+matchmaker = Matchmaker()
+
+async def join_match_queue(ctx, game: str, bet: int):
+    guild_id = ctx.guild.id
+    currency = await get_currency(guild_id)
+    if bet and await get_balance(guild_id, ctx.author.id) < bet:
+        return await ctx.send("❌ Not enough balance for that bet.")
+    if matchmaker.waiting(guild_id, ctx.author.id):
+        return await ctx.send(f"You're already in a queue. `{COMMAND_PREFIX}bloopqueue leave` to leave it.")
+    other, channel = matchmaker.join(guild_id, game, bet, ctx.author, ctx.channel)
+    if other is None:
+        stake = f" for about **{fmt(bet, currency)}**" if bet else ""
+        return await ctx.send(f"🔎 Looking for a **{game}** opponent{stake} anywhere in this server "
+                              f"(up to {MATCH_TIMEOUT_SECONDS // 60} min).")
+    p1, p2 = other.member, ctx.author
+    for ch in {other.channel.id: other.channel, ctx.channel.id: ctx.channel}.values():
+        if ch.id != channel.id:
+            outbound.send(ch, f"🎯 Match found: {p1.mention} vs {p2.mention} — play in {channel.mention}!")
+    if game == "ttt":
+        reward = (await guild_configs.get(guild_id)).ttt_reward
+        await start_ttt(ctx, p1, p2, reward=reward, channel=channel)
+    else:
+        await start_match_dice(ctx.guild, channel, p1, p2, min(bet, other.bet), currency)
+
+async def start_match_dice(guild, channel, p1, p2, bet: int, currency: str):
+    # a two-player round settled on the spot, so unlike lobbies there's nothing to escrow
+    if not await try_debit(guild.id, p1.id, bet):
+        outbound.send(channel, f"❌ Match called off: {p1.mention} can no longer cover **{fmt(bet, currency)}**.")
+        return
+    if not await try_debit(guild.id, p2.id, bet):
+        await add_balance(guild.id, p1.id, bet)
+        matchmaker.refunds["dice"] += 1
+        outbound.send(channel, f"❌ Match called off: {p2.mention} can no longer cover **{fmt(bet, currency)}**. "
+                               f"{p1.mention}'s bet was refunded.")
+        return
+    rolls = {p.id: random.randint(1, 6) for p in (p1, p2)}
+    high = max(rolls.values())
+    winners = [uid for uid, r in rolls.items() if r == high]
+    for uid in rolls:
+        badges.game_result(guild.id, uid, uid in winners)
+    pot = bet * 2
+    for uid in winners:
+        await add_balance(guild.id, uid, pot // len(winners))
+    key = ("match_dice", channel.id, p1.id, p2.id)
+    outbound.send(channel, f"🎲 **Matched dice** for **{fmt(bet, currency)}** each\n"
+                           + "\n".join(f"<@{uid}> rolled **{r}**" for uid, r in rolls.items()), merge_key=key)
+    if len(winners) == 1:
+        send_win_gif(channel, note=f"<@{winners[0]}> won the pot: **{fmt(pot, currency)}**!", merge_key=key)
+    else:
+        outbound.send(channel, "🤝 Tie! Bets returned.", merge_key=key)
+
+@bot.command(name="bloopqueue")
+async def bloopqueue(ctx, game: str = None, bet: str = None):
+    game = (game or "").lower()
+    if game == "leave":
+        left = matchmaker.leave(ctx.guild.id, ctx.author.id)
+        return await ctx.send("👋 Left the queue." if left else "You're not in a queue.")
+    if game not in MATCH_GAMES or (game == "dice" and not (bet or "").isdigit()):
+        return await ctx.send(f"Usage: `{COMMAND_PREFIX}bloopqueue ttt`, `{COMMAND_PREFIX}bloopqueue dice <bet>` "
+                              f"or `{COMMAND_PREFIX}bloopqueue leave`")
+    amount = int(bet) if game == "dice" else 0
+    if game == "dice" and amount <= 0:
+        return await ctx.send("Bet must be positive.")
+    await join_match_queue(ctx, game, amount)
+
 # -------------------------
 # TIC TAC TOE GAME
 # -------------------------
-class TTTView(discord.ui.View):
-    def __init__(self, ctx, player_x: discord.Member, player_o: discord.Member, reward:int=25):
+class TTTView(OutboundView):
+    def __init__(self, ctx, player_x: discord.Member, player_o: discord.Member, reward:int=TTT_REWARD):
         super().__init__(timeout=120)
         self.ctx = ctx
         self.px = player_x
@@ -639,7 +1560,7 @@ class TTTView(discord.ui.View):
 
     async def make_move(self, interaction: discord.Interaction):
         if self.finished:
-            return
+            return await interaction.response.defer()
         if interaction.user.id not in (self.px.id, self.po.id):
             return await interaction.response.send_message("You are not in this game.", ephemeral=True)
         if interaction.user.id != self.turn:
@@ -667,8 +1588,11 @@ class TTTView(discord.ui.View):
 
             if winner:
                 win_user = self.px if winner == "X" else self.po
-                currency = get_currency(self.ctx.guild.id)
-                add_balance(self.ctx.guild.id, win_user.id, self.reward)
+                lose_user = self.po if winner == "X" else self.px
+                badges.game_result(self.ctx.guild.id, win_user.id, True)
+                badges.game_result(self.ctx.guild.id, lose_user.id, False)
+                currency = await get_currency(self.ctx.guild.id)
+                await add_balance(self.ctx.guild.id, win_user.id, self.reward)
                 status = f"🏆 {win_user.mention} wins **{fmt(self.reward, currency)}**!"
             else:
                 status = "🤝 It's a draw!"
@@ -731,7 +1655,7 @@ def format_hand(hand, hide_first=False):
         return f"🃏 {' '.join(hand[1:])}"
     return ' '.join(hand)
 
-class BlackjackView(discord.ui.View):
+class BlackjackView(OutboundView):
     def __init__(self, ctx, bet: int):
         super().__init__(timeout=60)
         self.ctx = ctx
@@ -747,7 +1671,7 @@ class BlackjackView(discord.ui.View):
             return await interaction.response.send_message("This isn't your game!", ephemeral=True)
 
         if self.finished:
-            return
+            return await interaction.response.defer()
 
         self.player_hand.append(self.deck.pop())
         player_val = hand_value(self.player_hand)
@@ -755,6 +1679,7 @@ class BlackjackView(discord.ui.View):
         if player_val > 21:
             # Bust
             self.finished = True
+            badges.game_result(self.ctx.guild.id, self.ctx.author.id, False)
             for child in self.children:
                 child.disabled = True
 
@@ -776,7 +1701,7 @@ class BlackjackView(discord.ui.View):
             return await interaction.response.send_message("This isn't your game!", ephemeral=True)
 
         if self.finished:
-            return
+            return await interaction.response.defer()
 
         self.finished = True
         for child in self.children:
@@ -790,20 +1715,22 @@ class BlackjackView(discord.ui.View):
         dealer_val = hand_value(self.dealer_hand)
 
         # Determine winner
-        currency = get_currency(self.ctx.guild.id)
+        if player_val != dealer_val:
+            badges.game_result(self.ctx.guild.id, self.ctx.author.id, dealer_val > 21 or player_val > dealer_val)
+        currency = await get_currency(self.ctx.guild.id)
         if dealer_val > 21:
             # Dealer bust, player wins
-            add_balance(self.ctx.guild.id, self.ctx.author.id, self.bet * 2)
+            await add_balance(self.ctx.guild.id, self.ctx.author.id, self.bet * 2)
             result = f"🎉 **YOU WIN!** Dealer busted! +{fmt(self.bet * 2, currency)}"
             color = discord.Color.green()
         elif player_val > dealer_val:
             # Player wins
-            add_balance(self.ctx.guild.id, self.ctx.author.id, self.bet * 2)
+            await add_balance(self.ctx.guild.id, self.ctx.author.id, self.bet * 2)
             result = f"🎉 **YOU WIN!** +{fmt(self.bet * 2, currency)}"
             color = discord.Color.green()
         elif player_val == dealer_val:
             # Push (tie)
-            add_balance(self.ctx.guild.id, self.ctx.author.id, self.bet)
+            await add_balance(self.ctx.guild.id, self.ctx.author.id, self.bet)
             result = f"🤝 **PUSH!** It's a tie! +{fmt(self.bet, currency)}"
             color = discord.Color.orange()
         else:
@@ -831,16 +1758,19 @@ async def start_blackjack(ctx, bet: int):
         for child in view.children:
             child.disabled = True
 
-        currency = get_currency(ctx.guild.id)
+        badges.natural_blackjack(ctx.guild.id, ctx.author.id)
+        if dealer_val != 21:
+            badges.game_result(ctx.guild.id, ctx.author.id, True)
+        currency = await get_currency(ctx.guild.id)
         if dealer_val == 21:
             # Both blackjack, push
-            add_balance(ctx.guild.id, ctx.author.id, bet)
+            await add_balance(ctx.guild.id, ctx.author.id, bet)
             result = f"🤝 **BLACKJACK PUSH!** Both got 21! +{fmt(bet, currency)}"
             color = discord.Color.orange()
         else:
             # Player blackjack wins
             winnings = int(bet * 2.5)  # Blackjack pays 3:2
-            add_balance(ctx.guild.id, ctx.author.id, winnings)
+            await add_balance(ctx.guild.id, ctx.author.id, winnings)
             result = f"🃏 **BLACKJACK!** +{fmt(winnings, currency)}"
             color = discord.Color.gold()
 
@@ -858,10 +1788,10 @@ async def start_blackjack(ctx, bet: int):
 
         await ctx.send(embed=embed, view=view)
 
-async def start_ttt(ctx, p1: discord.Member, p2: discord.Member):
-    view = TTTView(ctx, p1, p2)
+async def start_ttt(ctx, p1: discord.Member, p2: discord.Member, reward: int = TTT_REWARD, channel=None):
+    view = TTTView(ctx, p1, p2, reward=reward)
     embed = view.create_embed()
-    await ctx.send(embed=embed, view=view)
+    await (channel or ctx).send(embed=embed, view=view)
 
 # -------------------------
 # /POLL SLASH COMMAND
@@ -882,30 +1812,189 @@ async def poll(interaction: discord.Interaction, question: str, option1: str, op
 
 
 
+# -------------------------
+# HEALTH / ADMIN HTTP SERVER
+# -------------------------
+# Served by aiohttp on the bot's own event loop (no second thread, no Flask).
+web = None  # aiohttp.web, imported by start_http_server() so plain imports of main stay light
+HTTP_PORT = int(os.environ.get("PORT", 10000))
+# /api/* needs "Authorization: Bearer <token>"; without a token the routes aren't served at all,
+# since this port is the public keep-alive port
+HTTP_TOKEN = os.environ.get("BLOOP_HTTP_TOKEN")
+HTTP_CACHE_TTL_SECONDS = 5
+HTTP_CACHE_MAX_KEYS = 1024
+LEADERBOARD_API_MAX = 100
+
+started_at = time.monotonic()
+command_counts = {}  # command name -> completed invocations
+http_cache = {}  # key -> (expires_at, payload)
 
-# --- KEEP ALIVE SECTION ---
-
-
-from flask import Flask
-from threading import Thread
-
-app = Flask(__name__)
-
-@app.route("/")
-def home():
-    return "Bloop is alive!"
-
-def run():
-    port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port)
-
-def keep_alive():
-    t = Thread(target=run, daemon=True)
-    t.start()
-
-
+@bot.event
+async def on_command_completion(ctx: commands.Context):
+    name = ctx.command.qualified_name
+    command_counts[name] = command_counts.get(name, 0) + 1
+
+async def cached(key, build, ttl: float = HTTP_CACHE_TTL_SECONDS):
+    now = time.monotonic()
+    hit = http_cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    if len(http_cache) >= HTTP_CACHE_MAX_KEYS:
+        for k in [k for k, (exp, _) in http_cache.items() if exp <= now]:
+            del http_cache[k]
+        if len(http_cache) >= HTTP_CACHE_MAX_KEYS:
+            http_cache.clear()
+    payload = await build()
+    http_cache[key] = (now + ttl, payload)
+    return payload
+
+def gateway_latency_ms():
+    lat = bot.latency
+    return None if lat != lat or lat == float("inf") else round(lat * 1000, 1)  # nan/inf before first heartbeat
+
+def api_authorized(request) -> bool:
+    if not HTTP_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {HTTP_TOKEN}".encode())
+
+async def http_root(request):
+    return web.Response(text="Bloop is alive!")
+
+async def http_healthz(request):
+    # liveness: answering at all means the event loop is not wedged
+    return web.json_response({"status": "ok", "uptime_s": int(time.monotonic() - started_at)})
+
+async def http_readyz(request):
+    latency = gateway_latency_ms()
+    db_ok = await store.ping()
+    ready = bot.is_ready() and latency is not None and db_ok
+    body = {"ready": ready, "gateway_latency_ms": latency, "db": "ok" if db_ok else "error", "guilds": len(bot.guilds)}
+    return web.json_response(body, status=200 if ready else 503)
+
+async def http_metrics(request):
+    latency = gateway_latency_ms()
+    lines = [
+        "# TYPE bloop_up gauge",
+        f"bloop_up {1 if bot.is_ready() else 0}",
+        "# TYPE bloop_uptime_seconds gauge",
+        f"bloop_uptime_seconds {time.monotonic() - started_at:.0f}",
+        "# TYPE bloop_gateway_latency_seconds gauge",
+        f"bloop_gateway_latency_seconds {latency / 1000 if latency is not None else 'NaN'}",
+        "# TYPE bloop_guilds gauge",
+        f"bloop_guilds {len(bot.guilds)}",
+        "# TYPE bloop_dice_sessions gauge",
+        f"bloop_dice_sessions {len(dice_sessions)}",
+        "# TYPE bloop_cached_members gauge",
+        f"bloop_cached_members {sum(len(g.members) for g in bot.guilds)}",
+        "# TYPE bloop_member_name_cache_entries gauge",
+        f"bloop_member_name_cache_entries {len(member_names.entries)}",
+        "# TYPE bloop_member_name_lookups_total counter",
+        f'bloop_member_name_lookups_total{{result="hit"}} {member_names.hits}',
+        f'bloop_member_name_lookups_total{{result="miss"}} {member_names.misses}',
+        "# TYPE bloop_guild_config_cache_entries gauge",
+        f"bloop_guild_config_cache_entries {len(guild_configs.entries)}",
+        "# TYPE bloop_guild_config_loads_total counter",
+        f"bloop_guild_config_loads_total {guild_configs.loads}",
+        "# TYPE bloop_economy_stats_guilds gauge",
+        f"bloop_economy_stats_guilds {len(economy_stats.guilds)}",
+        "# TYPE bloop_economy_stats_corrections_total counter",
+        f"bloop_economy_stats_corrections_total {economy_stats.corrections}",
+        "# TYPE bloop_badges_awarded_total counter",
+        f"bloop_badges_awarded_total {badges.awarded}",
+        "# TYPE bloop_badges_queued gauge",
+        f"bloop_badges_queued {len(badges.pending)}",
+        "# TYPE bloop_dice_lobbies_total counter",
+        *(f'bloop_dice_lobbies_total{{result="{k}"}} {n}' for k, n in dice_lobby_results.items()),
+        "# TYPE bloop_match_queue_waiting gauge",
+        f"bloop_match_queue_waiting {len(matchmaker.by_user)}",
+        "# TYPE bloop_matches_total counter",
+        *(f'bloop_matches_total{{game="{g}"}} {n}' for g, n in matchmaker.matches.items()),
+        "# TYPE bloop_match_timeouts_total counter",
+        *(f'bloop_match_timeouts_total{{game="{g}"}} {n}' for g, n in matchmaker.timeouts.items()),
+        "# TYPE bloop_match_refunds_total counter",
+        *(f'bloop_match_refunds_total{{game="{g}"}} {n}' for g, n in matchmaker.refunds.items()),
+        "# TYPE bloop_match_wait_seconds summary",
+        *(f'bloop_match_wait_seconds_sum{{game="{g}"}} {t:.3f}' for g, t in matchmaker.wait_sum.items()),
+        *(f'bloop_match_wait_seconds_count{{game="{g}"}} {n}' for g, n in matchmaker.matches.items()),
+        "# TYPE bloop_outbound_queue_depth gauge",
+        f"bloop_outbound_queue_depth {outbound.depth()}",
+        "# TYPE bloop_outbound_messages_total counter",
+        f'bloop_outbound_messages_total{{result="sent"}} {outbound.sent}',
+        f'bloop_outbound_messages_total{{result="merged"}} {outbound.merged}',
+        f'bloop_outbound_messages_total{{result="cosmetic_dropped"}} {outbound.dropped}',
+        "# TYPE bloop_http_429_total counter",
+        f"bloop_http_429_total {outbound.rate_limited}",
+        "# TYPE bloop_commands_total counter",
+    ]
+    lines += [f'bloop_commands_total{{command="{name}"}} {n}' for name, n in sorted(command_counts.items())]
+    return web.Response(text="\n".join(lines) + "\n", content_type="text/plain")
+
+async def http_balance(request):
+    if not api_authorized(request):
+        return web.json_response({"error": "unauthorized"}, status=401)
+    try:
+        guild_id = int(request.match_info["guild_id"])
+        user_id = int(request.match_info["user_id"])
+    except ValueError:
+        return web.json_response({"error": "ids must be integers"}, status=400)
+
+    async def build():
+        return {"guild_id": str(guild_id), "user_id": str(user_id),
+                "balance": await get_balance(guild_id, user_id), "currency": await get_currency(guild_id)}
+    return web.json_response(await cached(("balance", guild_id, user_id), build))
+
+async def http_leaderboard(request):
+    if not api_authorized(request):
+        return web.json_response({"error": "unauthorized"}, status=401)
+    try:
+        guild_id = int(request.match_info["guild_id"])
+        limit = min(max(int(request.query.get("limit", 10)), 1), LEADERBOARD_API_MAX)
+    except ValueError:
+        return web.json_response({"error": "guild_id and limit must be integers"}, status=400)
+
+    async def build():
+        rows = await store.top_balances(guild_id, limit)
+        return {"guild_id": str(guild_id), "currency": await get_currency(guild_id),
+                "leaders": [{"rank": i, "user_id": str(uid), "balance": int(bal or 0)}
+                            for i, (uid, bal) in enumerate(rows, start=1)]}
+    return web.json_response(await cached(("leaderboard", guild_id, limit), build))
+
+async def start_http_server():
+    global web
+    from aiohttp import web
+    app = web.Application()
+    app.add_routes([
+        web.get("/", http_root),
+        web.get("/healthz", http_healthz),
+        web.get("/readyz", http_readyz),
+        web.get("/metrics", http_metrics),
+    ])
+    if HTTP_TOKEN:
+        app.add_routes([
+            web.get("/api/guilds/{guild_id}/balances/{user_id}", http_balance),
+            web.get("/api/guilds/{guild_id}/leaderboard", http_leaderboard),
+        ])
+    else:
+        print("BLOOP_HTTP_TOKEN not set: /api routes disabled")
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", HTTP_PORT).start()
+    print(f"HTTP server listening on :{HTTP_PORT}")
+    return runner
 
 # -------------------------
 # RUN
 # -------------------------
-bot.run(os.getenv("DISCORD_TOKEN"))
\ No newline at end of file
+async def main():
+    discord.utils.setup_logging()
+    await open_storage()
+    async with bot:
+        runner = await start_http_server()
+        try:
+            await bot.start(os.getenv("DISCORD_TOKEN"))
+        finally:
+            await runner.cleanup()
+            await store.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,964 @@
+# Bloop — storage backends.
+#
+# Everything the bot persists goes through a Storage: accounts, cooldowns, loans, servers
+# (currency/treasury), per-guild config, economy flow totals, game sessions (escrowed dice lobbies)
+# and small bot metadata.
+#
+#   SQLiteStorage("bloop.sqlite3")            default, single file, single writer
+#   PostgresStorage("postgresql://...")       asyncpg pool, many shards/processes
+#
+# Money moves are single atomic statements guarded by "balance >= amount" (or one short
+# transaction with a fixed lock order), so nothing needs SELECT ... FOR UPDATE and concurrent
+# commands can never overdraw an account. storage_contract.py runs the same checks against both.
+#
+# Badges are a bitset in users.badge_bits. They are never written on their own: the balance
+# writes take a `badges` mask that is OR-ed into the same row in the same statement.
+#
+# Only the standard library is imported at module level; asyncpg (pip install asyncpg) is
+# imported by PostgresStorage.setup(), so SQLite-only deployments don't need it.
+
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+DEFAULT_CURRENCY = "Bloop Coins"
+
+# badge key -> bit in users.badge_bits; bits are stored, so never renumber or reuse one
+BADGE_BITS = {
+    "first_blackjack": 1 << 0,
+    "win_streak_10": 1 << 1,
+    "top_10": 1 << 2,
+    "loan_repaid": 1 << 3,
+}
+
+def badges_from_text_sql(column: str = "badges") -> str:
+    # the old comma-separated users.badges TEXT → a bitset expression
+    return " | ".join(f"(CASE WHEN ',' || COALESCE({column}, '') || ',' LIKE '%,{key},%' THEN {bit} ELSE 0 END)"
+                      for key, bit in BADGE_BITS.items())
+
+class Storage(ABC):
+    # every method is abstract, so a backend missing one fails when it is constructed
+    @abstractmethod
+    async def setup(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def close(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def ping(self) -> bool:
+        raise NotImplementedError
+
+    # --- bot metadata ---
+    @abstractmethod
+    async def get_meta(self, key: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_meta(self, key: str, value: str):
+        raise NotImplementedError
+
+    # --- servers ---
+    @abstractmethod
+    async def get_currency(self, guild_id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_currency(self, guild_id: int, name: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def transfer_treasury(self, src_guild_id: int, dst_guild_id: int, amount: int) -> bool:
+        raise NotImplementedError
+
+    # --- per-guild config (settings are an opaque JSON string here) ---
+    @abstractmethod
+    async def get_guild_config(self, guild_id: int):
+        # (version, settings), or None if the guild never changed anything
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_guild_config(self, guild_id: int, settings: str, expected_version: int):
+        # compare-and-set: replaces the settings only if the stored version is still
+        # expected_version (0 = no row yet) and returns the new version (1, 2, ...), else None
+        raise NotImplementedError
+
+    @abstractmethod
+    async def changed_guild_configs(self, since: datetime) -> list:
+        # [(guild_id, version)] written at or after `since`
+        raise NotImplementedError
+
+    # --- accounts ---
+    @abstractmethod
+    async def get_balance(self, guild_id: int, user_id: int) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_balance(self, guild_id: int, user_id: int, delta: int, badges: int = 0) -> int:
+        # returns the new balance; `badges` bits are OR-ed into the account in the same write
+        raise NotImplementedError
+
+    @abstractmethod
+    async def try_debit(self, guild_id: int, user_id: int, amount: int, badges: int = 0):
+        # new balance, or None (and no change, badges included) if the account holds less than amount
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_badges(self, guild_id: int, user_id: int) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def transfer(self, guild_id: int, src_id: int, dst_id: int, amount: int):
+        # (src_balance, dst_balance), or None (and no change) if src holds less than amount
+        raise NotImplementedError
+
+    @abstractmethod
+    async def top_balances(self, guild_id: int, limit: int) -> list:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def balance_summary(self, guild_id: int):
+        # (total, holders with balance > 0, min balance)
+        raise NotImplementedError
+
+    @abstractmethod
+    async def nonzero_balances(self, guild_id: int) -> list:
+        # every non-zero balance in the guild, for (re)building economy_stats aggregates
+        raise NotImplementedError
+
+    # --- economy flows (money credited/debited per source) ---
+    @abstractmethod
+    async def get_flows(self, guild_id: int) -> dict:
+        # {source: (credited, debited)}
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_flows(self, guild_id: int, flows: dict):
+        # adds {source: (credited, debited)} to the stored totals
+        raise NotImplementedError
+
+    # --- cooldowns ---
+    @abstractmethod
+    async def get_cooldown(self, guild_id: int, user_id: int, name: str):
+        # naive UTC datetime, or None
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_cooldown(self, guild_id: int, user_id: int, name: str, until: datetime):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def claim_cooldown(self, guild_id: int, user_id: int, name: str, now: datetime, until: datetime):
+        # atomically starts the cooldown if it has expired by `now`: None if claimed, otherwise
+        # the time it runs until (and nothing changes)
+        raise NotImplementedError
+
+    # --- loans ---
+    @abstractmethod
+    async def create_loan(self, guild_id: int, lender_id: int, borrower_id: int, amount: int) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def accept_loan(self, loan_id: int):
+        # moves the money and marks it accepted: (lender_balance, borrower_balance), or None if the
+        # loan is no longer pending or the lender can't cover it
+        raise NotImplementedError
+
+    @abstractmethod
+    async def reject_loan(self, loan_id: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def repay_loan(self, guild_id: int, borrower_id: int, lender_id: int = None, badges: int = 0):
+        # pays back the borrower's oldest accepted loan (to lender_id, if given) in full and marks it
+        # repaid: (loan_id, lender_id, amount, borrower_balance, lender_balance), or None if there is
+        # no such loan or the borrower can't cover it. `badges` go to the borrower.
+        raise NotImplementedError
+
+    # --- game sessions (escrowed bets, so a restart can refund them) ---
+    @abstractmethod
+    async def open_session(self, channel_id: int, guild_id: int, game: str, host_id: int, bet: int) -> bool:
+        # False if the channel already has a session
+        raise NotImplementedError
+
+    @abstractmethod
+    async def join_session(self, channel_id: int, user_id: int, bet: int) -> bool:
+        # False if the session is gone or the user is already in it
+        raise NotImplementedError
+
+    @abstractmethod
+    async def close_session(self, channel_id: int):
+        # (guild_id, {user_id: bet}) and deletes the session, or None if there wasn't one
+        raise NotImplementedError
+
+    @abstractmethod
+    async def stale_sessions(self, before: datetime) -> list:
+        # channel ids of sessions created before `before`
+        raise NotImplementedError
+
+# -------------------------
+# SQLITE
+# -------------------------
+# Append-only: each entry runs once, in its own transaction, and is recorded in schema_version.
+# Never edit a released migration; add a new one instead.
+SQLITE_MIGRATIONS = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS users(
+            guild_id INTEGER,
+            user_id INTEGER,
+            balance INTEGER DEFAULT 0,
+            last_daily TEXT,
+            badges TEXT DEFAULT '',
+            PRIMARY KEY(guild_id, user_id)
+        );
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS servers(
+            guild_id INTEGER PRIMARY KEY,
+            currency_name TEXT DEFAULT '{DEFAULT_CURRENCY}',
+            debt INTEGER DEFAULT 0,
+            treasury INTEGER DEFAULT 0
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS loans(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER,
+            lender_id INTEGER,
+            borrower_id INTEGER,
+            amount INTEGER,
+            status TEXT, -- pending, accepted, rejected
+            created_at TEXT
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS cooldowns(
+            guild_id INTEGER,
+            user_id INTEGER,
+            name TEXT,
+            next_time TEXT,
+            PRIMARY KEY(guild_id, user_id, name)
+        );
+        """,
+    ]),
+    (2, [
+        "CREATE TABLE IF NOT EXISTS bot_meta(key TEXT PRIMARY KEY, value TEXT);",
+    ]),
+    (3, [
+        """
+        CREATE TABLE IF NOT EXISTS game_sessions(
+            channel_id INTEGER PRIMARY KEY,
+            guild_id INTEGER,
+            game TEXT,
+            created_at TEXT
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS session_bets(
+            channel_id INTEGER,
+            user_id INTEGER,
+            bet INTEGER,
+            PRIMARY KEY(channel_id, user_id)
+        );
+        """,
+    ]),
+    (4, [
+        """
+        CREATE TABLE IF NOT EXISTS guild_config(
+            guild_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            settings TEXT NOT NULL,
+            updated_at TEXT
+        );
+        """,
+    ]),
+    (5, [
+        """
+        CREATE TABLE IF NOT EXISTS economy_flows(
+            guild_id INTEGER,
+            source TEXT,
+            credited INTEGER NOT NULL DEFAULT 0,
+            debited INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(guild_id, source)
+        );
+        """,
+    ]),
+    (6, [
+        "ALTER TABLE users ADD COLUMN badge_bits INTEGER NOT NULL DEFAULT 0;",
+        f"UPDATE users SET badge_bits = {badges_from_text_sql()} WHERE COALESCE(badges, '') != '';",
+        # DROP COLUMN needs SQLite 3.35+; on older libraries the unused column just stays behind
+        *(["ALTER TABLE users DROP COLUMN badges;"] if sqlite3.sqlite_version_info >= (3, 35) else []),
+    ]),
+    (7, [
+        # natural key so re-importing an export upserts loans instead of duplicating them; earlier
+        # imports may already have duplicated some, keep the original row
+        "DELETE FROM loans WHERE id NOT IN (SELECT MIN(id) FROM loans "
+        "GROUP BY guild_id, lender_id, borrower_id, amount, created_at);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS loans_natural_key "
+        "ON loans(guild_id, lender_id, borrower_id, amount, created_at);",
+    ]),
+]
+
+def sqlite_migrate(conn: sqlite3.Connection, migrations=SQLITE_MIGRATIONS):
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version(version INTEGER PRIMARY KEY, applied_at TEXT);")
+    current = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+    for version, statements in migrations:
+        if version <= current:
+            continue
+        try:
+            conn.execute("BEGIN")
+            for stmt in statements:
+                conn.execute(stmt)
+            conn.execute("INSERT INTO schema_version(version, applied_at) VALUES(?,?)",
+                         (version, datetime.utcnow().isoformat()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"DB migrated to schema v{version}")
+
+class SQLiteStorage(Storage):
+    # One connection used from the event loop thread. Each method runs to completion without
+    # awaiting, so its statements can't interleave with another command's.
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = None
+
+    async def setup(self):
+        self.conn = sqlite3.connect(self.path)
+        # WAL lets exports/snapshots read on their own connections without blocking our writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        sqlite_migrate(self.conn)
+
+    async def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    async def ping(self) -> bool:
+        try:
+            self.conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _one(self, sql: str, params=()):
+        return self.conn.execute(sql, params).fetchone()
+
+    def _write(self, statements):
+        # statements: [(sql, params)] committed together
+        try:
+            for sql, params in statements:
+                self.conn.execute(sql, params)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    async def get_meta(self, key: str):
+        row = self._one("SELECT value FROM bot_meta WHERE key=?", (key,))
+        return row[0] if row else None
+
+    async def set_meta(self, key: str, value: str):
+        self._write([("INSERT INTO bot_meta(key, value) VALUES(?,?) "
+                      "ON CONFLICT(key) DO UPDATE SET value=excluded.value", (key, value))])
+
+    async def get_currency(self, guild_id: int):
+        row = self._one("SELECT currency_name FROM servers WHERE guild_id=?", (guild_id,))
+        return row[0] if row and row[0] else None
+
+    async def set_currency(self, guild_id: int, name: str):
+        self._write([("INSERT INTO servers(guild_id, currency_name) VALUES(?,?) "
+                      "ON CONFLICT(guild_id) DO UPDATE SET currency_name=excluded.currency_name", (guild_id, name))])
+
+    async def transfer_treasury(self, src_guild_id: int, dst_guild_id: int, amount: int) -> bool:
+        c = self.conn
+        try:
+            c.execute("INSERT OR IGNORE INTO servers(guild_id) VALUES(?)", (dst_guild_id,))
+            debit = c.execute("UPDATE servers SET treasury=treasury-? WHERE guild_id=? AND COALESCE(treasury,0) >= ?",
+                              (amount, src_guild_id, amount))
+            if debit.rowcount != 1:
+                c.rollback()
+                return False
+            c.execute("UPDATE servers SET treasury=COALESCE(treasury,0)+? WHERE guild_id=?", (amount, dst_guild_id))
+            c.commit()
+            return True
+        except Exception:
+            c.rollback()
+            raise
+
+    async def get_guild_config(self, guild_id: int):
+        return self._one("SELECT version, settings FROM guild_config WHERE guild_id=?", (guild_id,))
+
+    async def set_guild_config(self, guild_id: int, settings: str, expected_version: int):
+        now = datetime.utcnow().isoformat()
+        try:
+            if expected_version == 0:
+                cur = self.conn.execute("INSERT INTO guild_config(guild_id, version, settings, updated_at) "
+                                        "VALUES(?,1,?,?) ON CONFLICT(guild_id) DO NOTHING",
+                                        (guild_id, settings, now))
+            else:
+                cur = self.conn.execute("UPDATE guild_config SET version=version+1, settings=?, updated_at=? "
+                                        "WHERE guild_id=? AND version=?",
+                                        (settings, now, guild_id, expected_version))
+            self.conn.commit()
+            return expected_version + 1 if cur.rowcount == 1 else None
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    async def changed_guild_configs(self, since: datetime) -> list:
+        return self.conn.execute("SELECT guild_id, version FROM guild_config WHERE updated_at >= ?",
+                                 (since.isoformat(),)).fetchall()
+
+    async def get_balance(self, guild_id: int, user_id: int) -> int:
+        row = self._one("SELECT balance FROM users WHERE guild_id=? AND user_id=?", (guild_id, user_id))
+        return int(row[0] or 0) if row else 0
+
+    def _credit(self, guild_id: int, user_id: int, delta: int, badges: int = 0) -> int:
+        self.conn.execute("INSERT INTO users(guild_id, user_id, balance, badge_bits) VALUES(?,?,?,?) "
+                          "ON CONFLICT(guild_id, user_id) DO UPDATE SET balance=COALESCE(balance,0)+excluded.balance, "
+                          "badge_bits=badge_bits|excluded.badge_bits",
+                          (guild_id, user_id, delta, badges))
+        return self._one("SELECT balance FROM users WHERE guild_id=? AND user_id=?", (guild_id, user_id))[0]
+
+    def _debit(self, guild_id: int, user_id: int, amount: int, badges: int = 0):
+        c = self.conn.execute("UPDATE users SET balance=balance-?, badge_bits=badge_bits|? "
+                              "WHERE guild_id=? AND user_id=? AND balance >= ?",
+                              (amount, badges, guild_id, user_id, amount))
+        if c.rowcount != 1:
+            return None
+        return self._one("SELECT balance FROM users WHERE guild_id=? AND user_id=?", (guild_id, user_id))[0]
+
+    async def add_balance(self, guild_id: int, user_id: int, delta: int, badges: int = 0) -> int:
+        try:
+            bal = self._credit(guild_id, user_id, delta, badges)
+            self.conn.commit()
+            return bal
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    async def try_debit(self, guild_id: int, user_id: int, amount: int, badges: int = 0):
+        try:
+            bal = self._debit(guild_id, user_id, amount, badges)
+            self.conn.commit()
+            return bal
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    async def get_badges(self, guild_id: int, user_id: int) -> int:
+        row = self._one("SELECT badge_bits FROM users WHERE guild_id=? AND user_id=?", (guild_id, user_id))
+        return row[0] if row else 0
+
+    async def transfer(self, guild_id: int, src_id: int, dst_id: int, amount: int):
+        try:
+            src_bal = self._debit(guild_id, src_id, amount)
+            if src_bal is None:
+                self.conn.rollback()
+                return None
+            dst_bal = self._credit(guild_id, dst_id, amount)
+            self.conn.commit()
+            return src_bal, dst_bal
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    async def top_balances(self, guild_id: int, limit: int) -> list:
+        return self.conn.execute("SELECT user_id, balance FROM users WHERE guild_id=? ORDER BY balance DESC LIMIT ?",
+                                 (guild_id, limit)).fetchall()
+
+    async def balance_summary(self, guild_id: int):
+        row = self._one("SELECT COALESCE(SUM(balance),0), COUNT(CASE WHEN balance > 0 THEN 1 END), COALESCE(MIN(balance),0) "
+                        "FROM users WHERE guild_id=?", (guild_id,))
+        return int(row[0]), int(row[1]), int(row[2])
+
+    async def nonzero_balances(self, guild_id: int) -> list:
+        rows = self.conn.execute("SELECT balance FROM users WHERE guild_id=? AND balance != 0", (guild_id,))
+        return [r[0] for r in rows]
+
+    async def get_flows(self, guild_id: int) -> dict:
+        rows = self.conn.execute("SELECT source, credited, debited FROM economy_flows WHERE guild_id=?", (guild_id,))
+        return {r[0]: (r[1], r[2]) for r in rows}
+
+    async def add_flows(self, guild_id: int, flows: dict):
+        self._write([("INSERT INTO economy_flows(guild_id, source, credited, debited) VALUES(?,?,?,?) "
+                      "ON CONFLICT(guild_id, source) DO UPDATE SET credited=credited+excluded.credited, "
+                      "debited=debited+excluded.debited", (guild_id, source, c, d))
+                     for source, (c, d) in flows.items()])
+
+    async def get_cooldown(self, guild_id: int, user_id: int, name: str):
+        row = self._one("SELECT next_time FROM cooldowns WHERE guild_id=? AND user_id=? AND name=?",
+                        (guild_id, user_id, name))
+        return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+    async def set_cooldown(self, guild_id: int, user_id: int, name: str, until: datetime):
+        self._write([("""
+            INSERT INTO cooldowns(guild_id, user_id, name, next_time)
+            VALUES(?,?,?,?)
+            ON CONFLICT(guild_id, user_id, name) DO UPDATE SET next_time=excluded.next_time
+        """, (guild_id, user_id, name, until.isoformat()))])
+
+    async def claim_cooldown(self, guild_id: int, user_id: int, name: str, now: datetime, until: datetime):
+        try:
+            cur = self.conn.execute("""
+                INSERT INTO cooldowns(guild_id, user_id, name, next_time)
+                VALUES(?,?,?,?)
+                ON CONFLICT(guild_id, user_id, name) DO UPDATE SET next_time=excluded.next_time
+                WHERE cooldowns.next_time IS NULL OR cooldowns.next_time <= ?
+            """, (guild_id, user_id, name, until.isoformat(), now.isoformat()))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return None if cur.rowcount == 1 else await self.get_cooldown(guild_id, user_id, name)
+
+    async def create_loan(self, guild_id: int, lender_id: int, borrower_id: int, amount: int) -> int:
+        c = self.conn.execute("INSERT INTO loans(guild_id, lender_id, borrower_id, amount, status, created_at) "
+                              "VALUES(?,?,?,?,?,?)",
+                              (guild_id, lender_id, borrower_id, amount, "pending", datetime.utcnow().isoformat()))
+        self.conn.commit()
+        return c.lastrowid
+
+    async def accept_loan(self, loan_id: int):
+        try:
+            row = self._one("SELECT guild_id, lender_id, borrower_id, amount FROM loans WHERE id=? AND status='pending'",
+                            (loan_id,))
+            if not row:
+                return None
+            guild_id, lender_id, borrower_id, amount = row
+            lender_bal = self._debit(guild_id, lender_id, amount)
+            if lender_bal is None:
+                self.conn.rollback()
+                return None
+            borrower_bal = self._credit(guild_id, borrower_id, amount)
+            self.conn.execute("UPDATE loans SET status='accepted' WHERE id=?", (loan_id,))
+            self.conn.commit()
+            return lender_bal, borrower_bal
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    async def reject_loan(self, loan_id: int) -> bool:
+        c = self.conn.execute("UPDATE loans SET status='rejected' WHERE id=? AND status='pending'", (loan_id,))
+        self.conn.commit()
+        return c.rowcount == 1
+
+    async def repay_loan(self, guild_id: int, borrower_id: int, lender_id: int = None, badges: int = 0):
+        try:
+            row = self._one("SELECT id, lender_id, amount FROM loans WHERE guild_id=? AND borrower_id=? "
+                            "AND status='accepted' AND (? IS NULL OR lender_id=?) ORDER BY id LIMIT 1",
+                            (guild_id, borrower_id, lender_id, lender_id))
+            if not row:
+                return None
+            loan_id, lender_id, amount = row
+            borrower_bal = self._debit(guild_id, borrower_id, amount, badges)
+            if borrower_bal is None:
+                self.conn.rollback()
+                return None
+            lender_bal = self._credit(guild_id, lender_id, amount)
+            self.conn.execute("UPDATE loans SET status='repaid' WHERE id=?", (loan_id,))
+            self.conn.commit()
+            return loan_id, lender_id, amount, borrower_bal, lender_bal
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    async def open_session(self, channel_id: int, guild_id: int, game: str, host_id: int, bet: int) -> bool:
+        try:
+            c = self.conn.execute("INSERT OR IGNORE INTO game_sessions(channel_id, guild_id, game, created_at) "
+                                  "VALUES(?,?,?,?)", (channel_id, guild_id, game, datetime.utcnow().isoformat()))
+            if c.rowcount != 1:
+                self.conn.rollback()
+                return False
+            self.conn.execute("INSERT OR REPLACE INTO session_bets(channel_id, user_id, bet) VALUES(?,?,?)",
+                              (channel_id, host_id, bet))
+            self.conn.commit()
+            return True
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    async def join_session(self, channel_id: int, user_id: int, bet: int) -> bool:
+        c = self.conn.execute("INSERT OR IGNORE INTO session_bets(channel_id, user_id, bet) "
+                              "SELECT ?,?,? WHERE EXISTS(SELECT 1 FROM game_sessions WHERE channel_id=?)",
+                              (channel_id, user_id, bet, channel_id))
+        self.conn.commit()
+        return c.rowcount == 1
+
+    async def close_session(self, channel_id: int):
+        try:
+            row = self._one("SELECT guild_id FROM game_sessions WHERE channel_id=?", (channel_id,))
+            if not row:
+                return None
+            bets = dict(self.conn.execute("SELECT user_id, bet FROM session_bets WHERE channel_id=?",
+                                          (channel_id,)).fetchall())
+            self.conn.execute("DELETE FROM session_bets WHERE channel_id=?", (channel_id,))
+            self.conn.execute("DELETE FROM game_sessions WHERE channel_id=?", (channel_id,))
+            self.conn.commit()
+            return row[0], bets
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    async def stale_sessions(self, before: datetime) -> list:
+        rows = self.conn.execute("SELECT channel_id FROM game_sessions WHERE created_at < ?",
+                                 (before.isoformat(),)).fetchall()
+        return [r[0] for r in rows]
+
+# -------------------------
+# POSTGRESQL (asyncpg)
+# -------------------------
+PG_MIGRATIONS = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS users(
+            guild_id BIGINT,
+            user_id BIGINT,
+            balance BIGINT NOT NULL DEFAULT 0,
+            last_daily TEXT,
+            badges TEXT DEFAULT '',
+            PRIMARY KEY(guild_id, user_id)
+        );
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS servers(
+            guild_id BIGINT PRIMARY KEY,
+            currency_name TEXT DEFAULT '{DEFAULT_CURRENCY}',
+            debt BIGINT NOT NULL DEFAULT 0,
+            treasury BIGINT NOT NULL DEFAULT 0
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS loans(
+            id BIGSERIAL PRIMARY KEY,
+            guild_id BIGINT,
+            lender_id BIGINT,
+            borrower_id BIGINT,
+            amount BIGINT,
+            status TEXT, -- pending, accepted, rejected
+            created_at TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS cooldowns(
+            guild_id BIGINT,
+            user_id BIGINT,
+            name TEXT,
+            next_time TIMESTAMP,
+            PRIMARY KEY(guild_id, user_id, name)
+        );
+        """,
+        "CREATE TABLE IF NOT EXISTS bot_meta(key TEXT PRIMARY KEY, value TEXT);",
+        """
+        CREATE TABLE IF NOT EXISTS game_sessions(
+            channel_id BIGINT PRIMARY KEY,
+            guild_id BIGINT,
+            game TEXT,
+            created_at TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS session_bets(
+            channel_id BIGINT,
+            user_id BIGINT,
+            bet BIGINT,
+            PRIMARY KEY(channel_id, user_id)
+        );
+        """,
+    ]),
+    (2, [
+        """
+        CREATE TABLE IF NOT EXISTS guild_config(
+            guild_id BIGINT PRIMARY KEY,
+            version INT NOT NULL,
+            settings TEXT NOT NULL,
+            updated_at TIMESTAMP
+        );
+        """,
+    ]),
+    (3, [
+        """
+        CREATE TABLE IF NOT EXISTS economy_flows(
+            guild_id BIGINT,
+            source TEXT,
+            credited BIGINT NOT NULL DEFAULT 0,
+            debited BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY(guild_id, source)
+        );
+        """,
+    ]),
+    (4, [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS badge_bits BIGINT NOT NULL DEFAULT 0;",
+        f"UPDATE users SET badge_bits = {badges_from_text_sql()} WHERE COALESCE(badges, '') != '';",
+        "ALTER TABLE users DROP COLUMN IF EXISTS badges;",
+    ]),
+    (5, [
+        "DELETE FROM loans a USING loans b WHERE a.id > b.id AND a.guild_id = b.guild_id "
+        "AND a.lender_id = b.lender_id AND a.borrower_id = b.borrower_id AND a.amount = b.amount "
+        "AND a.created_at = b.created_at;",
+        "CREATE UNIQUE INDEX IF NOT EXISTS loans_natural_key "
+        "ON loans(guild_id, lender_id, borrower_id, amount, created_at);",
+    ]),
+]
+
+class PostgresStorage(Storage):
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10, schema: str = None):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.schema = schema
+        self.pool = None
+
+    async def setup(self):
+        import asyncpg
+        settings = {"search_path": self.schema} if self.schema else None
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size,
+                                              server_settings=settings)
+        async with self.pool.acquire() as c:
+            # serialize concurrent starts of several shards on the same database
+            async with c.transaction():
+                await c.execute("SELECT pg_advisory_xact_lock(hashtext('bloop_schema'))")
+                await c.execute("CREATE TABLE IF NOT EXISTS schema_version(version INT PRIMARY KEY, applied_at TIMESTAMP)")
+                current = await c.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                for version, statements in PG_MIGRATIONS:
+                    if version <= current:
+                        continue
+                    for stmt in statements:
+                        await c.execute(stmt)
+                    await c.execute("INSERT INTO schema_version(version, applied_at) VALUES($1, $2)",
+                                    version, datetime.utcnow())
+                    print(f"DB migrated to schema v{version}")
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def ping(self) -> bool:
+        try:
+            return await self.pool.fetchval("SELECT 1") == 1
+        except Exception:
+            return False
+
+    async def get_meta(self, key: str):
+        return await self.pool.fetchval("SELECT value FROM bot_meta WHERE key=$1", key)
+
+    async def set_meta(self, key: str, value: str):
+        await self.pool.execute("INSERT INTO bot_meta(key, value) VALUES($1,$2) "
+                                "ON CONFLICT(key) DO UPDATE SET value=EXCLUDED.value", key, value)
+
+    async def get_currency(self, guild_id: int):
+        return await self.pool.fetchval("SELECT currency_name FROM servers WHERE guild_id=$1", guild_id) or None
+
+    async def set_currency(self, guild_id: int, name: str):
+        await self.pool.execute("INSERT INTO servers(guild_id, currency_name) VALUES($1,$2) "
+                                "ON CONFLICT(guild_id) DO UPDATE SET currency_name=EXCLUDED.currency_name", guild_id, name)
+
+    async def transfer_treasury(self, src_guild_id: int, dst_guild_id: int, amount: int) -> bool:
+        try:
+            async with self.pool.acquire() as c, c.transaction():
+                await c.execute("INSERT INTO servers(guild_id) VALUES($1) ON CONFLICT DO NOTHING", dst_guild_id)
+                # same lock order for every pair of guilds, so opposite transfers can't deadlock
+                for gid in sorted({src_guild_id, dst_guild_id}):
+                    if gid == src_guild_id:
+                        left = await c.fetchval("UPDATE servers SET treasury=treasury-$2 "
+                                                "WHERE guild_id=$1 AND treasury >= $2 RETURNING treasury", gid, amount)
+                        if left is None:
+                            raise _Rollback()
+                    if gid == dst_guild_id:
+                        await c.execute("UPDATE servers SET treasury=treasury+$2 WHERE guild_id=$1", gid, amount)
+                return True
+        except _Rollback:
+            return False
+
+    async def get_guild_config(self, guild_id: int):
+        row = await self.pool.fetchrow("SELECT version, settings FROM guild_config WHERE guild_id=$1", guild_id)
+        return (row[0], row[1]) if row else None
+
+    async def set_guild_config(self, guild_id: int, settings: str, expected_version: int):
+        if expected_version == 0:
+            return await self.pool.fetchval("INSERT INTO guild_config(guild_id, version, settings, updated_at) "
+                                            "VALUES($1,1,$2,$3) ON CONFLICT(guild_id) DO NOTHING RETURNING version",
+                                            guild_id, settings, datetime.utcnow())
+        return await self.pool.fetchval("UPDATE guild_config SET version=version+1, settings=$2, updated_at=$3 "
+                                        "WHERE guild_id=$1 AND version=$4 RETURNING version",
+                                        guild_id, settings, datetime.utcnow(), expected_version)
+
+    async def changed_guild_configs(self, since: datetime) -> list:
+        rows = await self.pool.fetch("SELECT guild_id, version FROM guild_config WHERE updated_at >= $1", since)
+        return [(r[0], r[1]) for r in rows]
+
+    async def get_balance(self, guild_id: int, user_id: int) -> int:
+        return await self.pool.fetchval("SELECT balance FROM users WHERE guild_id=$1 AND user_id=$2",
+                                        guild_id, user_id) or 0
+
+    CREDIT_SQL = ("INSERT INTO users(guild_id, user_id, balance, badge_bits) VALUES($1,$2,$3,$4) "
+                  "ON CONFLICT(guild_id, user_id) DO UPDATE SET balance=users.balance+EXCLUDED.balance, "
+                  "badge_bits=users.badge_bits|EXCLUDED.badge_bits RETURNING balance")
+    DEBIT_SQL = ("UPDATE users SET balance=balance-$3, badge_bits=badge_bits|$4 "
+                 "WHERE guild_id=$1 AND user_id=$2 AND balance >= $3 RETURNING balance")
+
+    async def add_balance(self, guild_id: int, user_id: int, delta: int, badges: int = 0) -> int:
+        return await self.pool.fetchval(self.CREDIT_SQL, guild_id, user_id, delta, badges)
+
+    async def try_debit(self, guild_id: int, user_id: int, amount: int, badges: int = 0):
+        return await self.pool.fetchval(self.DEBIT_SQL, guild_id, user_id, amount, badges)
+
+    async def get_badges(self, guild_id: int, user_id: int) -> int:
+        return await self.pool.fetchval("SELECT badge_bits FROM users WHERE guild_id=$1 AND user_id=$2",
+                                        guild_id, user_id) or 0
+
+    async def _move(self, c, guild_id: int, src_id: int, dst_id: int, amount: int, src_badges: int = 0):
+        # lock rows in user_id order; a failed debit raises _Rollback to undo an earlier credit
+        if src_id == dst_id:
+            bal = await c.fetchval("SELECT balance FROM users WHERE guild_id=$1 AND user_id=$2", guild_id, src_id)
+            if bal is None or bal < amount:
+                raise _Rollback()
+            if src_badges:
+                await c.execute("UPDATE users SET badge_bits=badge_bits|$3 WHERE guild_id=$1 AND user_id=$2",
+                                guild_id, src_id, src_badges)
+            return bal, bal
+        src_bal = dst_bal = None
+        for uid in sorted((src_id, dst_id)):
+            if uid == src_id:
+                src_bal = await c.fetchval(self.DEBIT_SQL, guild_id, src_id, amount, src_badges)
+                if src_bal is None:
+                    raise _Rollback()
+            else:
+                dst_bal = await c.fetchval(self.CREDIT_SQL, guild_id, dst_id, amount, 0)
+        return src_bal, dst_bal
+
+    async def transfer(self, guild_id: int, src_id: int, dst_id: int, amount: int):
+        try:
+            async with self.pool.acquire() as c, c.transaction():
+                return await self._move(c, guild_id, src_id, dst_id, amount)
+        except _Rollback:
+            return None
+
+    async def top_balances(self, guild_id: int, limit: int) -> list:
+        rows = await self.pool.fetch("SELECT user_id, balance FROM users WHERE guild_id=$1 ORDER BY balance DESC LIMIT $2",
+                                     guild_id, limit)
+        return [(r[0], r[1]) for r in rows]
+
+    async def balance_summary(self, guild_id: int):
+        row = await self.pool.fetchrow("SELECT COALESCE(SUM(balance),0), COUNT(*) FILTER (WHERE balance > 0), "
+                                       "COALESCE(MIN(balance),0) FROM users WHERE guild_id=$1", guild_id)
+        return int(row[0]), int(row[1]), int(row[2])
+
+    async def nonzero_balances(self, guild_id: int) -> list:
+        rows = await self.pool.fetch("SELECT balance FROM users WHERE guild_id=$1 AND balance != 0", guild_id)
+        return [r[0] for r in rows]
+
+    async def get_flows(self, guild_id: int) -> dict:
+        rows = await self.pool.fetch("SELECT source, credited, debited FROM economy_flows WHERE guild_id=$1", guild_id)
+        return {r[0]: (r[1], r[2]) for r in rows}
+
+    async def add_flows(self, guild_id: int, flows: dict):
+        await self.pool.executemany("INSERT INTO economy_flows(guild_id, source, credited, debited) VALUES($1,$2,$3,$4) "
+                                    "ON CONFLICT(guild_id, source) DO UPDATE SET "
+                                    "credited=economy_flows.credited+EXCLUDED.credited, "
+                                    "debited=economy_flows.debited+EXCLUDED.debited",
+                                    [(guild_id, source, c, d) for source, (c, d) in flows.items()])
+
+    async def get_cooldown(self, guild_id: int, user_id: int, name: str):
+        return await self.pool.fetchval("SELECT next_time FROM cooldowns WHERE guild_id=$1 AND user_id=$2 AND name=$3",
+                                        guild_id, user_id, name)
+
+    async def set_cooldown(self, guild_id: int, user_id: int, name: str, until: datetime):
+        await self.pool.execute("""
+            INSERT INTO cooldowns(guild_id, user_id, name, next_time)
+            VALUES($1,$2,$3,$4)
+            ON CONFLICT(guild_id, user_id, name) DO UPDATE SET next_time=EXCLUDED.next_time
+        """, guild_id, user_id, name, until)
+
+    async def claim_cooldown(self, guild_id: int, user_id: int, name: str, now: datetime, until: datetime):
+        claimed = await self.pool.fetchval("""
+            INSERT INTO cooldowns(guild_id, user_id, name, next_time)
+            VALUES($1,$2,$3,$4)
+            ON CONFLICT(guild_id, user_id, name) DO UPDATE SET next_time=EXCLUDED.next_time
+            WHERE cooldowns.next_time IS NULL OR cooldowns.next_time <= $5
+            RETURNING next_time
+        """, guild_id, user_id, name, until, now)
+        return None if claimed is not None else await self.get_cooldown(guild_id, user_id, name)
+
+    async def create_loan(self, guild_id: int, lender_id: int, borrower_id: int, amount: int) -> int:
+        return await self.pool.fetchval("INSERT INTO loans(guild_id, lender_id, borrower_id, amount, status, created_at) "
+                                        "VALUES($1,$2,$3,$4,'pending',$5) RETURNING id",
+                                        guild_id, lender_id, borrower_id, amount, datetime.utcnow())
+
+    async def accept_loan(self, loan_id: int):
+        try:
+            async with self.pool.acquire() as c, c.transaction():
+                # the status flip is the claim: a second accept finds nothing pending
+                row = await c.fetchrow("UPDATE loans SET status='accepted' WHERE id=$1 AND status='pending' "
+                                       "RETURNING guild_id, lender_id, borrower_id, amount", loan_id)
+                if row is None:
+                    return None
+                return await self._move(c, row["guild_id"], row["lender_id"], row["borrower_id"], row["amount"])
+        except _Rollback:
+            return None
+
+    async def reject_loan(self, loan_id: int) -> bool:
+        status = await self.pool.execute("UPDATE loans SET status='rejected' WHERE id=$1 AND status='pending'", loan_id)
+        return status.endswith(" 1")
+
+    async def repay_loan(self, guild_id: int, borrower_id: int, lender_id: int = None, badges: int = 0):
+        try:
+            async with self.pool.acquire() as c, c.transaction():
+                # claim the loan first (SKIP LOCKED: two concurrent repays pick different loans)
+                row = await c.fetchrow("UPDATE loans SET status='repaid' WHERE id=("
+                                       "SELECT id FROM loans WHERE guild_id=$1 AND borrower_id=$2 AND status='accepted' "
+                                       "AND ($3::BIGINT IS NULL OR lender_id=$3) ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED"
+                                       ") RETURNING id, lender_id, amount", guild_id, borrower_id, lender_id)
+                if row is None:
+                    return None
+                borrower_bal, lender_bal = await self._move(c, guild_id, borrower_id, row["lender_id"], row["amount"],
+                                                            src_badges=badges)
+                return row["id"], row["lender_id"], row["amount"], borrower_bal, lender_bal
+        except _Rollback:
+            return None
+
+    async def open_session(self, channel_id: int, guild_id: int, game: str, host_id: int, bet: int) -> bool:
+        async with self.pool.acquire() as c, c.transaction():
+            created = await c.fetchval("INSERT INTO game_sessions(channel_id, guild_id, game, created_at) "
+                                       "VALUES($1,$2,$3,$4) ON CONFLICT DO NOTHING RETURNING channel_id",
+                                       channel_id, guild_id, game, datetime.utcnow())
+            if created is None:
+                return False
+            await c.execute("INSERT INTO session_bets(channel_id, user_id, bet) VALUES($1,$2,$3) "
+                            "ON CONFLICT(channel_id, user_id) DO UPDATE SET bet=EXCLUDED.bet", channel_id, host_id, bet)
+            return True
+
+    async def join_session(self, channel_id: int, user_id: int, bet: int) -> bool:
+        status = await self.pool.execute("INSERT INTO session_bets(channel_id, user_id, bet) "
+                                         "SELECT $1,$2,$3 WHERE EXISTS(SELECT 1 FROM game_sessions WHERE channel_id=$1) "
+                                         "ON CONFLICT DO NOTHING", channel_id, user_id, bet)
+        return status.endswith(" 1")
+
+    async def close_session(self, channel_id: int):
+        async with self.pool.acquire() as c, c.transaction():
+            guild_id = await c.fetchval("DELETE FROM game_sessions WHERE channel_id=$1 RETURNING guild_id", channel_id)
+            if guild_id is None:
+                return None
+            rows = await c.fetch("DELETE FROM session_bets WHERE channel_id=$1 RETURNING user_id, bet", channel_id)
+            return guild_id, {r[0]: r[1] for r in rows}
+
+    async def stale_sessions(self, before: datetime) -> list:
+        rows = await self.pool.fetch("SELECT channel_id FROM game_sessions WHERE created_at < $1", before)
+        return [r[0] for r in rows]
+
+class _Rollback(Exception):
+    # raised inside `async with c.transaction()` to abort it without treating it as an error
+    pass
+
+def storage_from_env(default_sqlite_path: str) -> Storage:
+    # BLOOP_DATABASE_URL=postgresql://... selects Postgres; anything else is the SQLite file
+    url = os.environ.get("BLOOP_DATABASE_URL", "")
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresStorage(url, max_size=int(os.environ.get("BLOOP_DB_POOL_SIZE", 10)))
+    return SQLiteStorage(url or default_sqlite_path)
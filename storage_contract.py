@@ -0,0 +1,200 @@
+# Contract checks every Storage backend must pass.
+#   python storage_contract.py                      SQLite (temp file)
+#   BLOOP_PG_DSN=postgresql://localhost/bloop_test python storage_contract.py
+#                                                   SQLite, then Postgres in a throwaway schema
+#
+# Exits non-zero on the first failing backend. Needs only the standard library for SQLite.
+
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+from storage import BADGE_BITS, PostgresStorage, SQLiteStorage
+
+G, G2 = 1001, 1002
+A, B, C = 11, 22, 33
+
+def check(cond, what):
+    if not cond:
+        raise AssertionError(what)
+
+async def contract(store):
+    check(await store.ping(), "ping")
+
+    # meta
+    check(await store.get_meta("k") is None, "missing meta is None")
+    await store.set_meta("k", "v1")
+    await store.set_meta("k", "v2")
+    check(await store.get_meta("k") == "v2", "meta upsert")
+
+    # servers
+    check(await store.get_currency(G) is None, "no currency before setup")
+    await store.set_currency(G, "Banana Bucks")
+    check(await store.get_currency(G) == "Banana Bucks", "set_currency")
+    check(not await store.transfer_treasury(G, G2, 1), "treasury can't go negative")
+
+    # guild config
+    check(await store.get_guild_config(G) is None, "no config before first write")
+    t0 = datetime.utcnow() - timedelta(seconds=1)
+    check(await store.set_guild_config(G, '{"daily_amount": 5}', 0) == 1, "first config version is 1")
+    check(await store.set_guild_config(G, '{"daily_amount": 6}', 0) is None, "stale create refused")
+    check(await store.set_guild_config(G, '{"daily_amount": 7}', 1) == 2, "config version increments")
+    check(await store.set_guild_config(G, '{"daily_amount": 8}', 1) is None, "stale update refused")
+    check(await store.get_guild_config(G) == (2, '{"daily_amount": 7}'), "get_guild_config")
+    check(await store.changed_guild_configs(t0) == [(G, 2)], "changed configs since")
+    check(await store.changed_guild_configs(datetime.utcnow() + timedelta(hours=1)) == [], "no changes later")
+
+    # accounts
+    check(await store.get_balance(G, A) == 0, "unknown account has 0")
+    check(await store.add_balance(G, A, 100) == 100, "add_balance returns new balance")
+    check(await store.add_balance(G, A, -30) == 70, "negative delta")
+    check(await store.try_debit(G, A, 71) is None, "overdraft refused")
+    check(await store.get_balance(G, A) == 70, "refused debit changes nothing")
+    check(await store.try_debit(G, A, 70) == 0, "debit to exactly zero")
+    check(await store.get_balance(G2, A) == 0, "balances are per guild")
+
+    await store.add_balance(G, A, 100)
+    check(await store.transfer(G, A, B, 40) == (60, 40), "transfer returns both balances")
+    check(await store.transfer(G, B, A, 41) is None, "transfer overdraft refused")
+    check(await store.get_balance(G, B) == 40, "refused transfer changes nothing")
+
+    # concurrency: 50 debits of 10 against 100 → exactly 10 succeed
+    await store.add_balance(G, C, 100)
+    results = await asyncio.gather(*(store.try_debit(G, C, 10) for _ in range(50)))
+    check(sum(r is not None for r in results) == 10, "concurrent debits never overdraw")
+    check(await store.get_balance(G, C) == 0, "concurrent debits leave 0")
+
+    # concurrency: opposite transfers conserve money (and don't deadlock)
+    await store.add_balance(G, C, 500)
+    before = await store.balance_summary(G)
+    moves = [store.transfer(G, A, C, 3) if i % 2 else store.transfer(G, C, A, 5) for i in range(60)]
+    await asyncio.gather(*moves)
+    after = await store.balance_summary(G)
+    check(before[0] == after[0], "transfers conserve total")
+    check(after[2] >= 0, "no negative balances")
+
+    check(sorted(await store.nonzero_balances(G)) == sorted(
+        [b for b in [await store.get_balance(G, u) for u in (A, B, C)] if b]), "nonzero_balances")
+
+    top = await store.top_balances(G, 2)
+    check(len(top) == 2 and top[0][1] >= top[1][1], "top_balances ordered")
+    total, holders, _ = await store.balance_summary(G)
+    check(total == sum([await store.get_balance(G, u) for u in (A, B, C)]), "summary total")
+    check(holders == sum([1 for u in (A, B, C) if await store.get_balance(G, u) > 0]), "summary holders")
+
+    # economy flows
+    check(await store.get_flows(G) == {}, "no flows yet")
+    await store.add_flows(G, {"daily": (100, 0), "games": (30, 50)})
+    await store.add_flows(G, {"games": (5, 0)})
+    check(await store.get_flows(G) == {"daily": (100, 0), "games": (35, 50)}, "flows accumulate")
+
+    # cooldowns
+    check(await store.get_cooldown(G, A, "daily") is None, "no cooldown yet")
+    until = datetime.utcnow().replace(microsecond=0) + timedelta(hours=1)
+    await store.set_cooldown(G, A, "daily", until)
+    await store.set_cooldown(G, A, "daily", until + timedelta(seconds=5))
+    check(await store.get_cooldown(G, A, "daily") == until + timedelta(seconds=5), "cooldown upsert")
+    now = datetime.utcnow().replace(microsecond=0)
+    check(await store.claim_cooldown(G, A, "daily", now, now + timedelta(hours=1)) == until + timedelta(seconds=5),
+          "running cooldown can't be claimed")
+    check(await store.claim_cooldown(G, A, "daily", until + timedelta(seconds=5), until + timedelta(hours=2)) is None,
+          "expired cooldown can be claimed")
+    check(await store.get_cooldown(G, A, "daily") == until + timedelta(hours=2), "claim sets the new end")
+
+    # concurrency: 20 simultaneous claims of a fresh cooldown → exactly one wins
+    results = await asyncio.gather(*(store.claim_cooldown(G, B, "daily", now, now + timedelta(hours=1))
+                                     for _ in range(20)))
+    check(sum(r is None for r in results) == 1, "concurrent claims succeed once")
+
+    # loans
+    lender_bal = await store.get_balance(G, A)
+    borrower_bal = await store.get_balance(G, B)
+    loan = await store.create_loan(G, A, B, 10)
+    check(await store.accept_loan(loan) == (lender_bal - 10, borrower_bal + 10), "accept moves money")
+    check(await store.accept_loan(loan) is None, "loan can only be accepted once")
+    check(not await store.reject_loan(loan), "accepted loan can't be rejected")
+    big = await store.create_loan(G, A, B, 10**9)
+    check(await store.accept_loan(big) is None, "lender must cover loan")
+    check(await store.get_balance(G, A) == lender_bal - 10, "failed accept changes nothing")
+    check(await store.reject_loan(big), "pending loan can be rejected")
+    check(await store.accept_loan(big) is None, "rejected loan can't be accepted")
+
+    # badges ride along with balance writes
+    first, streak = BADGE_BITS["first_blackjack"], BADGE_BITS["win_streak_10"]
+    check(await store.get_badges(G, C) == 0, "no badges yet")
+    await store.add_balance(G, C, 1, badges=first)
+    await store.add_balance(G, C, 1, badges=first)
+    check(await store.get_badges(G, C) == first, "badge bits are OR-ed, not added")
+    check(await store.try_debit(G, C, 10**9, badges=streak) is None, "refused debit")
+    check(await store.get_badges(G, C) == first, "refused debit awards nothing")
+    await store.try_debit(G, C, 1, badges=streak)
+    check(await store.get_badges(G, C) == first | streak, "debit awards badges")
+
+    # repaying loans
+    repaid = BADGE_BITS["loan_repaid"]
+    check(await store.repay_loan(G, C) is None, "nothing to repay")
+    await store.add_balance(G, A, 50)
+    l1 = await store.create_loan(G, A, C, 20)
+    l2 = await store.create_loan(G, A, C, 5)
+    await store.accept_loan(l1)
+    await store.accept_loan(l2)
+    c_bal, a_bal = await store.get_balance(G, C), await store.get_balance(G, A)
+    check(await store.repay_loan(G, C, A, badges=repaid) == (l1, A, 20, c_bal - 20, a_bal + 20), "repay oldest first")
+    check(await store.get_badges(G, C) & repaid, "repay awards badges")
+    await store.try_debit(G, C, await store.get_balance(G, C))
+    check(await store.repay_loan(G, C) is None, "borrower must cover repayment")
+    check(await store.get_balance(G, A) == a_bal + 20, "failed repay changes nothing")
+    await store.add_balance(G, C, 5)
+    check((await store.repay_loan(G, C))[0] == l2, "repay next loan")
+    check(await store.repay_loan(G, C) is None, "all loans repaid")
+
+    # sessions
+    ch = 555
+    check(await store.open_session(ch, G, "dice", A, 5), "open session")
+    check(not await store.open_session(ch, G, "dice", B, 5), "one session per channel")
+    check(await store.join_session(ch, B, 5), "join")
+    check(not await store.join_session(ch, B, 5), "join twice refused")
+    check(await store.stale_sessions(datetime.utcnow() + timedelta(seconds=1)) == [ch], "stale sessions")
+    check(await store.stale_sessions(datetime.utcnow() - timedelta(hours=1)) == [], "fresh sessions not stale")
+    check(await store.close_session(ch) == (G, {A: 5, B: 5}), "close returns bets")
+    check(await store.close_session(ch) is None, "close twice")
+    check(not await store.join_session(ch, C, 5), "can't join closed session")
+
+async def run_backend(name, make):
+    store = make()
+    await store.setup()
+    try:
+        await contract(store)
+    except AssertionError as e:
+        print(f"{name}: FAIL — {e}")
+        return False
+    finally:
+        await store.close()
+    print(f"{name}: ok")
+    return True
+
+async def main():
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        ok &= await run_backend("sqlite", lambda: SQLiteStorage(os.path.join(tmp, "contract.sqlite3")))
+
+    dsn = os.environ.get("BLOOP_PG_DSN")
+    if dsn:
+        import asyncpg
+        schema = f"bloop_contract_{uuid.uuid4().hex[:8]}"
+        admin = await asyncpg.connect(dsn)
+        await admin.execute(f"CREATE SCHEMA {schema}")
+        try:
+            ok &= await run_backend("postgres", lambda: PostgresStorage(dsn, max_size=10, schema=schema))
+        finally:
+            await admin.execute(f"DROP SCHEMA {schema} CASCADE")
+            await admin.close()
+    else:
+        print("postgres: skipped (set BLOOP_PG_DSN to run)")
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)